@@ -59,6 +59,8 @@ def create_interface():
 
 if __name__ == "__main__":
     demo = create_interface()
+    # 显式配置队列：S3类操作可并行，提交类操作单独限流（见各click绑定的concurrency_id）
+    demo.queue(default_concurrency_limit=16, max_size=64)
     demo.launch(
         server_name="0.0.0.0",
         server_port=7860,
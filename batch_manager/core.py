@@ -2,16 +2,24 @@
 核心协调器模块
 BatchInferenceManager - 组合所有功能模块的主协调器
 """
+import boto3.session
 import os
-from typing import Dict, List, Tuple, Optional, Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, List, Tuple, Optional, Callable
 from .s3_manager import S3Manager
 from .text_processor import TextBatchProcessor
 from .image_processor import ImageBatchProcessor
 from .video_processor import VideoBatchProcessor
 from .job_manager import JobManager
-from .validator import PermissionValidator
+from .validator import PermissionValidator, ROLE_ARN_PATTERN, BUCKET_NAME_PATTERN
 from .single_inference_validator import SingleInferenceValidator
 
+# Bedrock批量推理单任务的记录数配额（默认值）：
+# 低于下限会被服务端直接拒绝，高于上限需要拆分任务。
+# 提交前本地校验，省去一次注定失败的CreateModelInvocationJob往返
+MIN_BATCH_RECORDS = 100
+MAX_BATCH_RECORDS = 50000
+
 
 class BatchInferenceManager:
     """
@@ -30,26 +38,32 @@ class BatchInferenceManager:
         self.bedrock_region = bedrock_region
         self.s3_region = s3_region
         
+        # 所有子模块共享一个boto3 Session：凭证/端点解析只做一次，
+        # 各客户端不再各自创建默认session
+        self.session = boto3.session.Session()
+
         # 初始化各个功能模块
-        self.s3_manager = S3Manager(s3_region)
+        self.s3_manager = S3Manager(s3_region, session=self.session)
         self.text_processor = TextBatchProcessor(self.s3_manager)
         self.image_processor = ImageBatchProcessor(self.s3_manager)
         self.video_processor = VideoBatchProcessor(self.s3_manager)
-        self.job_manager = JobManager(bedrock_region, self.s3_manager)
-        self.validator = PermissionValidator(s3_region, self.s3_manager)
-        self.inference_validator = SingleInferenceValidator(bedrock_region, self.s3_manager)
+        self.job_manager = JobManager(bedrock_region, self.s3_manager, session=self.session)
+        self.validator = PermissionValidator(s3_region, self.s3_manager, session=self.session)
+        self.inference_validator = SingleInferenceValidator(
+            bedrock_region, self.s3_manager, session=self.session)
         
         # 保持向后兼容的属性
         self.current_jobs = self.job_manager.current_jobs
     
     # S3相关方法
-    def list_input_files(self, bucket_name: str, prefix: str) -> List[Dict]:
+    def list_input_files(self, bucket_name: str, prefix: str, max_files: Optional[int] = None) -> List[Dict]:
         """列出输入bucket中的文件"""
-        return self.s3_manager.list_files(bucket_name, prefix)
+        return self.s3_manager.list_files(bucket_name, prefix, max_files)
     
-    def read_file_content(self, bucket_name: str, file_path: str) -> str:
-        """读取S3文件内容"""
-        return self.s3_manager.read_file(bucket_name, file_path)
+    def read_file_content(self, bucket_name: str, file_path: str,
+                          max_bytes: Optional[int] = None) -> str:
+        """读取S3文件内容（max_bytes限制只读文件开头若干字节）"""
+        return self.s3_manager.read_file(bucket_name, file_path, max_bytes)
     
     def upload_to_s3(self, local_file: str, bucket_name: str, s3_key: str) -> str:
         """上传文件到S3"""
@@ -64,6 +78,35 @@ class BatchInferenceManager:
     def normalize_prefix(prefix: str) -> str:
         """规范化S3前缀"""
         return S3Manager.normalize_prefix(prefix)
+
+    @staticmethod
+    def _validate_job_inputs(role_arn: str, input_bucket: str, output_bucket: str):
+        """
+        提交前的本地格式校验（纯本地检查，不产生任何网络调用）
+
+        放在扫描/下载/上传任何数据之前执行：格式错的Role ARN或bucket名
+        注定提交失败，没必要先花几分钟准备数据
+        """
+        if not role_arn or not ROLE_ARN_PATTERN.match(role_arn):
+            raise Exception(f"Role ARN格式不正确: {role_arn}")
+        for label, bucket in (('输入', input_bucket), ('输出', output_bucket)):
+            if (not bucket or len(bucket) < 3 or len(bucket) > 63
+                    or not BUCKET_NAME_PATTERN.match(bucket)):
+                raise Exception(f"{label}bucket名称格式无效: {bucket}")
+
+    @staticmethod
+    def _validate_record_count(count: int):
+        """提交前校验记录数是否落在Bedrock单任务配额内"""
+        if count < MIN_BATCH_RECORDS:
+            raise Exception(
+                f"记录数 {count} 低于Bedrock批量推理单任务最小要求（{MIN_BATCH_RECORDS}条），"
+                f"请增加输入文件数量"
+            )
+        if count > MAX_BATCH_RECORDS:
+            raise Exception(
+                f"记录数 {count} 超过Bedrock批量推理单任务上限（{MAX_BATCH_RECORDS}条），"
+                f"请拆分输入前缀后分别提交"
+            )
     
     # 文本批处理方法
     def prepare_batch_data(
@@ -75,8 +118,8 @@ class BatchInferenceManager:
         max_tokens: int = 2048,
         temperature: float = 0.1,
         progress_callback: Optional[Callable] = None
-    ) -> Tuple[List[Dict], str]:
-        """准备文本批量推理的数据"""
+    ) -> Tuple[int, BinaryIO, str]:
+        """准备文本批量推理的数据（写入内存缓冲，返回记录数量、缓冲和文件名）"""
         return self.text_processor.prepare_batch_data(
             bucket_name, prefix, prompt, model_id,
             max_tokens, temperature, progress_callback
@@ -136,40 +179,45 @@ class BatchInferenceManager:
     ) -> Dict:
         """创建文本批量推理任务"""
         try:
+            # 本地格式校验先行，避免格式错误在准备工作之后才暴露
+            self._validate_job_inputs(role_arn, input_bucket, output_bucket)
+
+            # 前缀只规范化一次（normalize_prefix对已规范化输入有快速路径）
+            input_prefix = S3Manager.normalize_prefix(input_prefix)
+            output_prefix = S3Manager.normalize_prefix(output_prefix)
+
             # 如果提供了本地文件，先上传
             if local_files:
                 if progress_callback:
                     progress_callback('upload', 0, len(local_files), '正在上传本地文件到S3...')
-                
-                raw_data_prefix = S3Manager.normalize_prefix(input_prefix) + "raw_data"
+
+                raw_data_prefix = f"{input_prefix}raw_data/"
                 self.upload_local_files(local_files, input_bucket, raw_data_prefix)
                 input_prefix = raw_data_prefix
-                
+
                 if progress_callback:
                     progress_callback('upload', len(local_files), len(local_files),
                                     f'已上传 {len(local_files)} 个本地文件')
             
-            # 规范化前缀
-            input_prefix = S3Manager.normalize_prefix(input_prefix)
-            output_prefix = S3Manager.normalize_prefix(output_prefix)
-            
-            # 准备批量数据
-            model_inputs, filename = self.prepare_batch_data(
+            # 准备批量数据（JSONL留在内存缓冲中，不落盘）
+            record_count, jsonl_buffer, filename = self.prepare_batch_data(
                 input_bucket, input_prefix, prompt, model_id,
                 progress_callback=progress_callback
             )
-            
-            # 上传JSONL文件到S3
+
+            # 记录数配额校验（尽早失败，避免无效的上传和提交）
+            self._validate_record_count(record_count)
+
+            # 从内存缓冲直接上传JSONL到S3
             s3_key = f"{input_prefix}{filename}" if input_prefix else filename
-            input_s3_uri = self.upload_to_s3(filename, input_bucket, s3_key)
-            
+            with jsonl_buffer:
+                input_s3_uri = self.s3_manager.upload_fileobj(
+                    jsonl_buffer, input_bucket, s3_key
+                )
+
             if progress_callback:
                 progress_callback('upload', 1, 1, f'✅ JSONL文件已上传到: {input_s3_uri}')
-            
-            # 清理本地临时文件
-            if os.path.exists(filename):
-                os.remove(filename)
-            
+
             # 创建批处理任务
             result = self.create_batch_job_from_jsonl(
                 input_s3_uri, output_bucket, output_prefix,
@@ -177,7 +225,7 @@ class BatchInferenceManager:
             )
             
             if result['success']:
-                result['message'] = f"成功提交批量推理任务，共{len(model_inputs)}个文件"
+                result['message'] = f"成功提交批量推理任务，共{record_count}个文件"
             
             return result
             
@@ -203,6 +251,9 @@ class BatchInferenceManager:
     ) -> Dict:
         """创建图片批量推理任务"""
         try:
+            # 本地格式校验先行，避免格式错误在准备工作之后才暴露
+            self._validate_job_inputs(role_arn, input_bucket, output_bucket)
+
             # 规范化前缀
             input_prefix = S3Manager.normalize_prefix(input_prefix)
             output_prefix = S3Manager.normalize_prefix(output_prefix)
@@ -212,18 +263,37 @@ class BatchInferenceManager:
                 input_bucket, input_prefix, system_prompt,
                 user_prompt, model_id, progress_callback
             )
-            
-            # 上传JSONL文件到S3
-            s3_key = f"{input_prefix}{filename}" if input_prefix else filename
-            input_s3_uri = self.upload_to_s3(filename, input_bucket, s3_key)
-            
+
+            try:
+                # 记录数配额校验（尽早失败，避免无效的上传和提交）
+                self._validate_record_count(image_count)
+
+                # 上传JSONL与权限验证并行：验证的STS/head_bucket探测
+                # （均有TTL缓存）与上传的网络往返重叠，几乎不增加耗时，
+                # 却能在提交任务前拦下注定失败的配置
+                s3_key = f"{input_prefix}{filename}" if input_prefix else filename
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    upload_future = executor.submit(
+                        self.upload_to_s3, filename, input_bucket, s3_key)
+                    validation_future = executor.submit(
+                        self.validator.validate_permissions,
+                        role_arn, input_bucket, output_bucket, model_id)
+                    input_s3_uri = upload_future.result()
+                    validation = validation_future.result()
+            finally:
+                # 单次unlink代替exists+remove（少一次stat，无TOCTOU竞争）；
+                # finally保证校验或上传失败时临时文件同样被清理
+                try:
+                    os.remove(filename)
+                except FileNotFoundError:
+                    pass
+
+            if not validation['valid']:
+                raise Exception("；".join(validation['errors']) or "权限验证未通过")
+
             if progress_callback:
                 progress_callback('upload', 1, 1, f'✅ JSONL文件已上传到: {input_s3_uri}')
-            
-            # 清理本地临时文件
-            if os.path.exists(filename):
-                os.remove(filename)
-            
+
             # 创建批处理任务
             result = self.create_batch_job_from_jsonl(
                 input_s3_uri, output_bucket, output_prefix,
@@ -246,27 +316,33 @@ class BatchInferenceManager:
         """获取任务状态"""
         return self.job_manager.get_job_status(job_arn)
     
-    def monitor_job(self, job_arn: str, check_interval: int = 30) -> Dict:
-        """监控任务直到完成或失败"""
-        return self.job_manager.monitor_job(job_arn, check_interval)
+    def monitor_job(self, job_arn: str) -> Dict:
+        """监控任务直到完成或失败（指数退避轮询）"""
+        return self.job_manager.monitor_job(job_arn)
     
-    def get_results_preview_only(self, job_arn: str, output_bucket: str, output_prefix: str, max_preview_lines: int = 3) -> Dict:
+    def get_results_preview_only(self, job_arn: str, output_bucket: str, output_prefix: str,
+                                 max_preview_lines: int = 3, preview_max_chars: int = 200) -> Dict:
         """
         获取任务结果预览和文件位置
-        
+
         Args:
             job_arn: 任务ARN
             output_bucket: 输出bucket
             output_prefix: 输出前缀
             max_preview_lines: 最大预览行数（文本/图片默认3行，视频建议1行）
+            preview_max_chars: 预览文本最大字符数（解析时截断）
         """
-        return self.job_manager.get_results_preview(job_arn, output_bucket, output_prefix, max_preview_lines)
+        return self.job_manager.get_results_preview(job_arn, output_bucket, output_prefix,
+                                                    max_preview_lines, preview_max_chars)
     
+    def iter_job_results(self, job_arn: str):
+        """懒加载遍历任务全部结果记录（结果分片并发下载解析）"""
+        return self.job_manager.iter_results(job_arn)
+
     # 保留向后兼容的方法名
     def get_job_results(self, job_arn: str, output_bucket: str, output_prefix: str) -> List[Dict]:
-        """获取任务结果（向后兼容）"""
-        result = self.get_results_preview_only(job_arn, output_bucket, output_prefix)
-        return result['preview']
+        """获取任务全部结果（向后兼容，bucket/prefix参数实际从API解析）"""
+        return list(self.job_manager.iter_results(job_arn))
     
     def create_video_batch_job(
         self,
@@ -283,6 +359,9 @@ class BatchInferenceManager:
     ) -> Dict:
         """创建视频批量推理任务"""
         try:
+            # 本地格式校验先行，避免格式错误在准备工作之后才暴露
+            self._validate_job_inputs(role_arn, input_bucket, output_bucket)
+
             # 规范化前缀
             input_prefix = S3Manager.normalize_prefix(input_prefix)
             output_prefix = S3Manager.normalize_prefix(output_prefix)
@@ -292,18 +371,25 @@ class BatchInferenceManager:
                 input_bucket, input_prefix, system_prompt,
                 user_prompt, model_id, progress_callback
             )
-            
-            # 上传JSONL文件到S3
-            s3_key = f"{input_prefix}{filename}" if input_prefix else filename
-            input_s3_uri = self.upload_to_s3(filename, input_bucket, s3_key)
-            
+
+            try:
+                # 记录数配额校验（尽早失败，避免无效的上传和提交）
+                self._validate_record_count(video_count)
+
+                # 上传JSONL文件到S3
+                s3_key = f"{input_prefix}{filename}" if input_prefix else filename
+                input_s3_uri = self.upload_to_s3(filename, input_bucket, s3_key)
+            finally:
+                # 单次unlink代替exists+remove（少一次stat，无TOCTOU竞争）；
+                # finally保证校验或上传失败时临时文件同样被清理
+                try:
+                    os.remove(filename)
+                except FileNotFoundError:
+                    pass
+
             if progress_callback:
                 progress_callback('upload', 1, 1, f'✅ JSONL文件已上传到: {input_s3_uri}')
-            
-            # 清理本地临时文件
-            if os.path.exists(filename):
-                os.remove(filename)
-            
+
             # 创建批处理任务
             result = self.create_batch_job_from_jsonl(
                 input_s3_uri, output_bucket, output_prefix,
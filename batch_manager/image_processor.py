@@ -1,13 +1,28 @@
 """
 图片批处理模块
 """
+import itertools
 import json
 import base64
+import io
 import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List, Dict, Tuple, Optional, Callable
 from .s3_manager import S3Manager
 
+# JSONL信封序列化用orjson（直接输出UTF-8字节），未安装时回退标准库
+try:
+    import orjson
+
+    def _jsonl_dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:
+    def _jsonl_dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
 # 配置日志
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -18,19 +33,54 @@ if not logger.handlers:
     handler.setFormatter(formatter)
     logger.addHandler(handler)
 
+# 可选的图片降采样依赖：装了Pillow才支持resize_max参数
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# 扩展名到API格式/媒体类型的映射：按真实文件类型填充请求字段，
+# PNG/WebP等不再被错误标成jpeg；未知扩展名回退jpeg保持旧行为
+_EXT_TO_FMT = {
+    '.jpg': 'jpeg', '.jpeg': 'jpeg', '.png': 'png',
+    '.gif': 'gif', '.bmp': 'bmp', '.webp': 'webp'
+}
+_EXT_TO_MIME = {
+    '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png',
+    '.gif': 'image/gif', '.bmp': 'image/bmp', '.webp': 'image/webp'
+}
+
+# 图片base64流式写入用的占位符：先序列化不含图片数据的JSON信封，
+# 以占位符为界拆成前后缀写出，图片字节在两者之间分块编码直接进文件，
+# 避免一次性构造整条多MB的base64字符串
+_IMAGE_B64_PLACEHOLDER = '__IMAGE_BASE64_PLACEHOLDER__'
+_IMAGE_B64_PLACEHOLDER_BYTES = _IMAGE_B64_PLACEHOLDER.encode('ascii')
+
 
 class ImageBatchProcessor:
     """处理图片批量推理的数据准备"""
     
-    def __init__(self, s3_manager: S3Manager):
+    def __init__(self, s3_manager: S3Manager, resize_max: Optional[int] = None,
+                 jpeg_quality: int = 85):
         """
         初始化图片批处理器
-        
+
         Args:
             s3_manager: S3管理器实例
+            resize_max: 图片长边上限（像素），超过时降采样并重编码为JPEG
+                        后再提交，可大幅缩小payload；None表示原样提交。
+                        需要安装Pillow，未安装时忽略该参数
+            jpeg_quality: 降采样重编码时的JPEG质量
         """
         self.s3_manager = s3_manager
+        self.resize_max = resize_max
+        self.jpeg_quality = jpeg_quality
+        if resize_max is not None and Image is None:
+            logger.warning("⚠️ 未安装Pillow，忽略resize_max参数，图片将原样提交")
+            self.resize_max = None
         self.image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']
+        # 扩展名过滤用frozenset做O(1)查找，大前缀下避免O(N·E)的endswith循环
+        self._ext_set = frozenset(self.image_extensions)
         self.jsonl_file = None
         self.processed_count = 0
     
@@ -75,15 +125,36 @@ class ImageBatchProcessor:
             if not files:
                 raise Exception(f"在 {bucket_name}/{prefix} 中未找到任何文件")
             
-            # 过滤出图片文件
+            # 过滤出图片文件（扩展名切一次、查一次集合）
             image_files = [
                 f for f in files
-                if any(f['file_name'].lower().endswith(ext) for ext in self.image_extensions)
+                if os.path.splitext(f['file_name'])[1].lower() in self._ext_set
             ]
             
             if not image_files:
                 raise Exception(f"在 {bucket_name}/{prefix} 中未找到任何图片文件")
-            
+
+            # 按列举到的对象大小预筛必然超限的文件：base64固定按4/3增长，
+            # 不用下载就能判定，直接省掉整次GET和编码。
+            # 启用降采样时原始大小不代表最终payload，预筛不适用
+            max_payload_size = 20 * 1024 * 1024  # 20MB限制
+            skipped_files = []
+            if self.resize_max is None:
+                downloadable = []
+                for file_info in image_files:
+                    predicted_b64 = (file_info['size'] + 2) // 3 * 4
+                    if predicted_b64 > max_payload_size:
+                        error_msg = (f"对象大小 {file_info['size']} bytes，"
+                                     f"Base64编码后约 {predicted_b64} 字符超过限制 {max_payload_size}")
+                        logger.warning(f"⚠️ 跳过图片 {file_info['file_name']}: {error_msg}")
+                        skipped_files.append({'file': file_info['file_name'], 'reason': error_msg})
+                    else:
+                        downloadable.append(file_info)
+                image_files = downloadable
+
+                if not image_files:
+                    raise Exception(f"在 {bucket_name}/{prefix} 中的图片文件均超过大小限制")
+
             total_files = len(image_files)
             logger.info(f"✅ 发现 {total_files} 个图片文件待处理")
             logger.debug(f"支持的图片格式: {', '.join(self.image_extensions)}")
@@ -94,61 +165,90 @@ class ImageBatchProcessor:
             logger.debug(f"步骤2: 创建JSONL文件...")
             timestamp = int(datetime.now().timestamp())
             filename = f'batch-image-{timestamp}.jsonl'
-            file_handle = open(filename, 'w', encoding='utf-8')
+            # 二进制模式：base64字节可直接写入，不经过str解码再编码；
+            # 1MB用户态缓冲：记录动辄数MB，避免小块write系统调用
+            file_handle = open(filename, 'wb', buffering=1024 * 1024)
             self.processed_count = 0
             logger.debug(f"JSONL文件已创建: {filename}")
             
-            # 步骤3: 流式处理每个图片，即时写入JSONL文件
-            logger.debug(f"步骤3: 开始逐个处理图片...")
-            skipped_files = []
-            
-            for idx, file_info in enumerate(image_files, 1):
-                file_path = file_info['file_path']
-                file_name = file_info['file_name']
-                file_size = file_info['size']
-                
-                size_str = self._format_file_size(file_size)
-                logger.debug(f"处理图片 [{idx}/{total_files}]: {file_name} ({size_str})")
-                
-                if progress_callback:
-                    progress_callback('process', idx, total_files,
-                                    f'正在处理图片: {file_name} ({size_str})')
-                
-                try:
-                    # 下载并编码图片
-                    image_data = self.s3_manager.read_binary_file(bucket_name, file_path)
-                    base64_image = base64.b64encode(image_data).decode('utf-8')
-                    base64_size = len(base64_image)
-                    logger.debug(f"图片数据大小: {file_size} bytes, Base64编码后: {base64_size} 字符")
-                    
-                    # 检查payload大小（Base64编码后不应超过约25MB，留一些余量用于其他字段）
-                    max_payload_size = 20 * 1024 * 1024  # 20MB限制
-                    if base64_size > max_payload_size:
-                        error_msg = f"Base64编码后大小 {base64_size} 字符超过限制 {max_payload_size}"
-                        logger.warning(f"⚠️ 跳过图片 {file_name}: {error_msg}")
-                        skipped_files.append({'file': file_name, 'reason': error_msg})
+            # 步骤3: 并发下载图片，主线程按原始顺序编码并流式写入
+            logger.debug(f"步骤3: 并发下载并逐个处理图片...")
+            # 进度回调按约1%的步长节流，避免大批量时O(N)次UI更新
+            progress_step = max(1, total_files // 100)
+
+            # 下载阶段用线程池重叠各对象GET的RTT（boto3客户端线程安全，
+            # 连接池已在S3Manager中调大）；base64编码、大小检查和JSONL
+            # 写入留在主线程，按提交顺序消费结果，recordId分配顺序与
+            # 串行版本完全一致
+            max_workers = min(32, total_files)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # 滑动窗口提交：在途下载不超过2×工作线程数，消费一个补交
+                # 一个。若一次性全量提交，先完成的乱序结果会积压在内存里
+                # 等待队头消费，峰值内存可逼近整批图片；窗口化后峰值有界
+                window = deque()
+                remaining = iter(image_files)
+                for pre_file in itertools.islice(remaining, max_workers * 2):
+                    window.append(executor.submit(self._fetch_image, bucket_name, pre_file))
+                idx = 0
+                while window:
+                    file_info, image_data, fetch_error = window.popleft().result()
+                    next_file = next(remaining, None)
+                    if next_file is not None:
+                        window.append(executor.submit(self._fetch_image, bucket_name, next_file))
+                    idx += 1
+                    file_name = file_info['file_name']
+                    file_size = file_info['size']
+
+                    if fetch_error is not None:
+                        logger.error(f"❌ 处理图片失败 {file_name}: {fetch_error}")
+                        skipped_files.append({'file': file_name, 'reason': fetch_error})
                         continue
+
+                    try:
+                        # 可选降采样：长边超限的图片缩到resize_max并重编码，
+                        # 重编码后的payload是JPEG，格式字段按.jpg取
+                        record_name = file_name
+                        if self.resize_max is not None:
+                            image_data, reencoded = self._maybe_downscale(image_data)
+                            if reencoded:
+                                record_name = f"{file_name}.jpg"
+
+                        # base64固定按4/3增长，编码前即可算出结果大小，
+                        # 不用为检查先分配一条完整的base64字符串
+                        base64_size = (len(image_data) + 2) // 3 * 4
+                        logger.debug(f"图片数据大小: {file_size} bytes, Base64编码后: {base64_size} 字符")
+
+                        # 兜底检查实际下载大小（列举后对象可能被覆盖变大）
+                        if base64_size > max_payload_size:
+                            error_msg = f"Base64编码后大小 {base64_size} 字符超过限制 {max_payload_size}"
+                            logger.warning(f"⚠️ 跳过图片 {file_name}: {error_msg}")
+                            skipped_files.append({'file': file_name, 'reason': error_msg})
+                            continue
                     
-                    # 生成模型输入
-                    model_input = self._create_model_input(
-                        system_prompt, user_prompt, base64_image, self.processed_count, model_id
-                    )
-                    
-                    # 立即写入JSONL文件（流式处理）
-                    self._write_single_record(file_handle, model_input)
-                    self.processed_count += 1
-                    logger.debug(f"✓ 图片处理完成: {file_name}, Record ID: {model_input['recordId']}")
-                    
-                    if progress_callback:
-                        progress_callback('process', idx, total_files,
-                                        f'已完成: {file_name} ({size_str})')
+                        # 生成模型输入信封（图片位置先放占位符，
+                        # record_id复用批次时间戳，不在循环内取时间）
+                        model_input = self._create_model_input(
+                            system_prompt, user_prompt, _IMAGE_B64_PLACEHOLDER,
+                            f"{timestamp}_{self.processed_count}", model_id, record_name
+                        )
+
+                        # 图片字节分块base64编码，流式写入JSONL
+                        self._write_record_streaming(file_handle, model_input, image_data)
+                        self.processed_count += 1
+
+                        if idx % progress_step == 0 or idx == total_files:
+                            size_str = self._format_file_size(file_size)
+                            logger.debug(f"✓ 图片处理完成 [{idx}/{total_files}]: {file_name} ({size_str})")
+                            if progress_callback:
+                                progress_callback('process', idx, total_files,
+                                                f'已完成: {file_name} ({size_str})')
                 
-                except Exception as e:
-                    error_msg = str(e)
-                    logger.error(f"❌ 处理图片失败 {file_name}: {error_msg}")
-                    skipped_files.append({'file': file_name, 'reason': error_msg})
-                    # 继续处理下一个图片
-                    continue
+                    except Exception as e:
+                        error_msg = str(e)
+                        logger.error(f"❌ 处理图片失败 {file_name}: {error_msg}")
+                        skipped_files.append({'file': file_name, 'reason': error_msg})
+                        # 继续处理下一个图片
+                        continue
             
             # 输出处理总结
             if skipped_files:
@@ -164,7 +264,6 @@ class ImageBatchProcessor:
                 file_handle = None
             
             logger.debug(f"步骤4: JSONL文件已关闭")
-            import os
             file_size = os.path.getsize(filename)
             logger.info(f"✅ JSONL文件生成成功: {filename}, 大小: {file_size} bytes")
             
@@ -184,36 +283,86 @@ class ImageBatchProcessor:
                 progress_callback('error', 0, 0, f'处理失败: {str(e)}')
             raise Exception(f"准备图片批量数据失败: {str(e)}")
     
+    def _fetch_image(self, bucket_name: str, file_info: Dict) -> Tuple[Dict, Optional[bytes], Optional[str]]:
+        """
+        下载单个图片（供下载线程池调用，异常以返回值形式带回主线程）
+
+        Args:
+            bucket_name: 输入bucket名称
+            file_info: list_files返回的文件信息
+
+        Returns:
+            (文件信息, 图片二进制数据或None, 错误信息或None)
+        """
+        try:
+            data = self.s3_manager.read_binary_file(
+                bucket_name, file_info['file_path'], size_hint=file_info['size'])
+            return file_info, data, None
+        except Exception as e:
+            return file_info, None, str(e)
+
+    def _maybe_downscale(self, image_data: bytes) -> Tuple[bytes, bool]:
+        """
+        长边超过resize_max的图片降采样并重编码为JPEG；
+        已在阈值内的图片原样返回，解码失败时按原图继续
+
+        Args:
+            image_data: 图片原始二进制数据
+
+        Returns:
+            (处理后的图片数据, 是否重编码过)
+        """
+        try:
+            img = Image.open(io.BytesIO(image_data))
+            if max(img.size) <= self.resize_max:
+                return image_data, False
+            original_size = len(image_data)
+            img.thumbnail((self.resize_max, self.resize_max), Image.LANCZOS)
+            buf = io.BytesIO()
+            img.convert('RGB').save(buf, format='JPEG',
+                                    quality=self.jpeg_quality, optimize=True)
+            resized = buf.getvalue()
+            logger.debug(f"图片降采样: {original_size} bytes -> {len(resized)} bytes")
+            return resized, True
+        except Exception as e:
+            logger.warning(f"⚠️ 图片降采样失败，按原图处理: {str(e)}")
+            return image_data, False
+
     def _create_model_input(
         self,
         system_prompt: str,
         user_prompt: str,
         base64_image: str,
-        index: int,
-        model_id: str
+        record_id: str,
+        model_id: str,
+        file_name: str
     ) -> Dict:
         """
         创建模型输入数据
-        
+
         Args:
             system_prompt: 系统提示词
             user_prompt: 用户提示词
             base64_image: Base64编码的图片
-            index: 索引
+            record_id: 记录ID（批次时间戳_序号）
             model_id: 模型ID
-            
+            file_name: 文件名（用于确定图片格式）
+
         Returns:
             模型输入字典
         """
-        record_id = f"{int(datetime.now().timestamp())}_{index}"
-        
+        # 按扩展名确定真实图片格式，未知时回退jpeg
+        ext = os.path.splitext(file_name)[1].lower()
+        image_format = _EXT_TO_FMT.get(ext, 'jpeg')
+        media_type = _EXT_TO_MIME.get(ext, 'image/jpeg')
+
         # 根据模型类型生成不同格式
         if 'nova' in model_id.lower():
             # Nova模型使用原生API格式
             content = [
                 {
                     "image": {
-                        "format": "jpeg",
+                        "format": image_format,
                         "source": {"bytes": base64_image}
                     }
                 },
@@ -252,7 +401,7 @@ class ImageBatchProcessor:
                                 "type": "image",
                                 "source": {
                                     "type": "base64",
-                                    "media_type": "image/jpeg",
+                                    "media_type": media_type,
                                     "data": base64_image
                                 }
                             },
@@ -274,38 +423,27 @@ class ImageBatchProcessor:
             "modelInput": body
         }
     
-    def _write_single_record(self, file_handle, record: Dict) -> None:
-        """
-        将单条记录写入JSONL文件并立即刷新
-        
-        Args:
-            file_handle: 已打开的文件句柄
-            record: 要写入的单条记录字典
-        """
-        json_str = json.dumps(record, ensure_ascii=False)
-        file_handle.write(json_str + '\n')
-        file_handle.flush()  # 立即刷新到磁盘，避免数据丢失
-    
-    def _write_jsonl_file(self, model_inputs: List[Dict]) -> str:
+    def _write_record_streaming(self, file_handle, record: Dict, image_data: bytes) -> None:
         """
-        写入JSONL文件
-        
+        流式写入单条记录：信封JSON按占位符一分为二，图片字节分块
+        base64编码后写在两者之间，全程不构造完整的base64字符串，
+        base64输出为纯ASCII字节、JSON安全，无需转义和解码
+
         Args:
-            model_inputs: 模型输入列表
-            
-        Returns:
-            文件名
+            file_handle: 已打开的二进制文件句柄
+            record: 图片位置为_IMAGE_B64_PLACEHOLDER占位符的记录字典
+            image_data: 图片原始二进制数据
         """
-        timestamp = int(datetime.now().timestamp())
-        filename = f'batch-image-{timestamp}.jsonl'
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            for item in model_inputs:
-                json_str = json.dumps(item, ensure_ascii=False)
-                f.write(json_str + '\n')
-        
-        return filename
-    
+        prefix, suffix = _jsonl_dumps(record).split(_IMAGE_B64_PLACEHOLDER_BYTES, 1)
+        file_handle.write(prefix)
+        # 57KB是3的倍数，各块编码结果无padding、可直接拼接
+        chunk_size = 57 * 1024
+        view = memoryview(image_data)
+        for offset in range(0, len(view), chunk_size):
+            file_handle.write(base64.b64encode(view[offset:offset + chunk_size]))
+        file_handle.write(suffix)
+        file_handle.write(b'\n')
+
     @staticmethod
     def _format_file_size(size: int) -> str:
         """格式化文件大小"""
@@ -2,13 +2,39 @@
 任务管理模块
 """
 import boto3
+import io
 import json
+import random
 import time
 import logging
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional, Tuple
 from .s3_manager import S3Manager
 
+# Bedrock客户端配置：加大连接池支撑monitor_jobs的并发状态查询，
+# 自适应重试平滑限流，长连接保活避免轮询间隔内连接被断开重建
+BEDROCK_CLIENT_CONFIG = Config(
+    max_pool_connections=64,
+    retries={'mode': 'adaptive', 'max_attempts': 5},
+    tcp_keepalive=True,
+    # 显式超时：挂死的连接快速失败进重试，不阻塞轮询循环
+    connect_timeout=5,
+    read_timeout=60
+)
+
+# 结果文件为JSONL（单行即完整记录），逐行解析天然流式；
+# 行内解析用orjson（C实现，大行解析明显更快），未安装时回退标准库
+try:
+    import orjson
+
+    def _json_loads(data):
+        return orjson.loads(data)
+except ImportError:
+    def _json_loads(data):
+        return json.loads(data)
+
 # 配置日志
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -23,17 +49,23 @@ if not logger.handlers:
 class JobManager:
     """处理Bedrock批处理任务的状态管理和结果获取"""
     
-    def __init__(self, bedrock_region: str, s3_manager: S3Manager):
+    def __init__(self, bedrock_region: str, s3_manager: S3Manager, session=None):
         """
         初始化任务管理器
-        
+
         Args:
             bedrock_region: Bedrock服务所在区域
             s3_manager: S3管理器实例
+            session: 共享的boto3 Session（None时用默认session）
         """
-        self.bedrock = boto3.client('bedrock', region_name=bedrock_region)
+        client_source = session if session is not None else boto3
+        self.bedrock = client_source.client('bedrock', region_name=bedrock_region,
+                                            config=BEDROCK_CLIENT_CONFIG)
         self.s3_manager = s3_manager
         self.current_jobs = {}
+        # job_arn -> (bucket, 结果文件key, manifest文件key)：
+        # 结果写入后位置不变，缓存后重复预览跳过状态查询和列举
+        self._result_location_cache = {}
     
     def create_job(
         self,
@@ -91,7 +123,7 @@ class JobManager:
             
             # 提交批量推理任务
             logger.info(f"📤 向Bedrock提交创建模型调用任务请求...")
-            response = self.bedrock.create_model_invocation_job(
+            response = self._create_job_with_backoff(
                 roleArn=role_arn,
                 modelId=model_id,
                 jobName=job_name,
@@ -131,6 +163,34 @@ class JobManager:
                 'message': f"创建批量任务失败: {str(e)}"
             }
     
+    def _create_job_with_backoff(self, **kwargs) -> Dict:
+        """
+        调用CreateModelInvocationJob，对瞬态错误做指数退避重试
+
+        提交前已经完成扫描和JSONL上传，丢掉一次瞬态控制面错误就等于
+        丢掉全部准备工作；客户端的自适应重试之上再做最多5次退避重试
+        （基础2秒，×2，上限60秒，±20%抖动），非瞬态错误立即抛出。
+        """
+        max_attempts = 5
+        delay = 2.0
+        for attempt in range(1, max_attempts + 1):
+            try:
+                return self.bedrock.create_model_invocation_job(**kwargs)
+            except Exception as e:
+                error_code = getattr(e, 'response', {}).get('Error', {}).get('Code', '')
+                retryable = error_code in (
+                    'ThrottlingException', 'TooManyRequestsException',
+                    'ServiceQuotaExceededException', 'ServiceUnavailableException',
+                    'InternalServerException'
+                )
+                if not retryable or attempt == max_attempts:
+                    raise
+                logger.warning(
+                    f"⚠️ 创建任务遇到瞬态错误({error_code})，"
+                    f"{delay:.0f}秒后重试 ({attempt}/{max_attempts})")
+                time.sleep(delay * random.uniform(0.8, 1.2))
+                delay = min(60.0, delay * 2)
+
     def get_job_status(self, job_arn: str) -> Dict:
         """
         获取任务状态
@@ -174,234 +234,408 @@ class JobManager:
                 'error': str(e)
             }
     
-    def monitor_job(self, job_arn: str, check_interval: int = 30) -> Dict:
+    def monitor_job(self, job_arn: str, initial_interval: float = 5.0,
+                    max_interval: float = 300.0) -> Dict:
         """
-        监控任务直到完成或失败
-        
+        监控任务直到完成或失败（指数退避轮询）
+
+        批处理任务通常运行数十分钟：间隔从initial_interval起每次×1.5，
+        状态发生变化时重置（状态刚变时更可能再变），并加±20%抖动
+        避免多个监控方同步轮询。
+
         Args:
             job_arn: 任务ARN
-            check_interval: 检查间隔（秒）
-            
+            initial_interval: 初始轮询间隔（秒）
+            max_interval: 轮询间隔上限（秒）
+
         Returns:
             最终任务状态
         """
+        interval = initial_interval
+        last_status = None
         while True:
             status_info = self.get_job_status(job_arn)
             status = status_info.get('status')
-            
+
             if status in ['Completed', 'Failed', 'Stopped']:
                 return status_info
-            
-            time.sleep(check_interval)
+
+            if status != last_status:
+                interval = initial_interval
+                last_status = status
+            else:
+                interval = min(max_interval, interval * 1.5)
+
+            time.sleep(interval * random.uniform(0.8, 1.2))
     
-    def get_results_preview(self, job_arn: str, output_bucket: str, output_prefix: str, max_preview_lines: int = 3) -> Dict:
+    def monitor_jobs(self, job_arns: List[str], initial_interval: float = 5.0,
+                     max_interval: float = 300.0):
+        """
+        在单个循环中监控多个任务，任务结束时逐个产出最终状态
+
+        相比对每个任务各起一个monitor_job线程，这里每个tick用共享线程池
+        并发查询所有未结束任务，主机上只占一个调用方线程；轮询间隔
+        与monitor_job相同的指数退避策略（有任务结束时重置）。
+
+        Args:
+            job_arns: 任务ARN列表
+            initial_interval: 初始轮询间隔（秒）
+            max_interval: 轮询间隔上限（秒）
+
+        Yields:
+            各任务的最终状态字典（按结束先后顺序）
+        """
+        pending = list(job_arns)
+        if not pending:
+            return
+        interval = initial_interval
+        # 线程池建一次贯穿整个监控周期（按初始任务数定容），
+        # 不在每个tick反复建池/销毁线程
+        with ThreadPoolExecutor(max_workers=min(16, len(pending))) as executor:
+            while pending:
+                status_infos = list(executor.map(self.get_job_status, pending))
+
+                still_pending = []
+                finished_this_tick = False
+                for job_arn, status_info in zip(pending, status_infos):
+                    if status_info.get('status') in ['Completed', 'Failed', 'Stopped']:
+                        finished_this_tick = True
+                        yield status_info
+                    else:
+                        still_pending.append(job_arn)
+                pending = still_pending
+
+                if not pending:
+                    return
+
+                if finished_this_tick:
+                    interval = initial_interval
+                else:
+                    interval = min(max_interval, interval * 1.5)
+
+                time.sleep(interval * random.uniform(0.8, 1.2))
+
+    def _resolve_result_location(self, job_arn: str) -> Tuple[str, str]:
+        """
+        解析已完成任务的结果目录位置
+
+        Args:
+            job_arn: 任务ARN
+
+        Returns:
+            (bucket名称, 结果目录前缀"输出前缀/job_id/")
+        """
+        job_status = self.get_job_status(job_arn)
+        if job_status.get('status') != 'Completed':
+            raise Exception(f"任务状态为 {job_status.get('status')}，请等待任务完成")
+
+        output_s3_uri = job_status.get('output_s3_uri')
+        if not output_s3_uri:
+            raise Exception("无法从任务信息中获取输出S3 URI")
+
+        # 解析S3 URI: s3://bucket/prefix/
+        s3_path = output_s3_uri.replace('s3://', '')
+        parts = s3_path.split('/', 1)
+        bucket = parts[0]
+        prefix = parts[1] if len(parts) > 1 else ''
+        if prefix and not prefix.endswith('/'):
+            prefix += '/'
+
+        # Bedrock会在输出路径下创建job_id子目录
+        job_id = job_arn.split('/')[-1]
+        return bucket, f"{prefix}{job_id}/"
+
+    @staticmethod
+    def _parse_result_line(result: Dict, preview_max_chars: Optional[int] = None) -> Optional[Dict]:
+        """
+        将一条已解析的结果JSON转换为统一的记录字典
+
+        Args:
+            result: 结果行的JSON字典（含modelOutput或error）
+            preview_max_chars: 输出文本截断长度（None表示不截断）
+
+        Returns:
+            统一格式的记录字典，格式无法识别时为None
+        """
+        if 'modelOutput' in result:
+            # 判断是Claude格式还是Nova格式
+            model_output = result['modelOutput']
+            if 'content' in model_output:
+                # Claude格式：直接有content
+                output_text = model_output['content'][0]['text']
+                stop_reason = model_output.get('stop_reason', 'unknown')
+            elif 'output' in model_output and 'message' in model_output['output']:
+                # Nova格式：output.message.content
+                output_text = model_output['output']['message']['content'][0]['text']
+                stop_reason = model_output.get('stopReason', 'unknown')
+            else:
+                return None
+
+            if preview_max_chars and len(output_text) > preview_max_chars:
+                output_text = output_text[:preview_max_chars] + '...'
+
+            return {
+                'record_id': result.get('recordId'),
+                'output_text': output_text,
+                'stop_reason': stop_reason,
+                'has_error': False
+            }
+
+        if 'error' in result:
+            error_info = result['error']
+            error_msg = f"错误码{error_info.get('errorCode', 'N/A')}: {error_info.get('errorMessage', '未知错误')}"
+            return {
+                'record_id': result.get('recordId'),
+                'output_text': f"[处理失败] {error_msg}",
+                'stop_reason': 'error',
+                'has_error': True,
+                'error_code': error_info.get('errorCode'),
+                'error_message': error_info.get('errorMessage'),
+                'retryable': error_info.get('retryable', False)
+            }
+
+        return None
+
+    def _download_and_parse_out(self, bucket: str, key: str) -> List[Dict]:
+        """
+        下载并解析单个.out结果分片（在线程池中执行，不截断输出文本）
+
+        Args:
+            bucket: S3 bucket名称
+            key: 分片对象键
+
+        Returns:
+            该分片内的全部结果记录
+        """
+        records = []
+        response = self.s3_manager.s3.get_object(Bucket=bucket, Key=key)
+        for raw_line in response['Body'].iter_lines(chunk_size=1 << 20):
+            if not raw_line.strip():
+                continue
+            try:
+                result = _json_loads(raw_line)
+            except ValueError as e:
+                logger.warning(f"分片 {key} 中有行JSON解析失败: {str(e)}")
+                continue
+            parsed = self._parse_result_line(result)
+            if parsed is not None:
+                records.append(parsed)
+        return records
+
+    def iter_results(self, job_arn: str, max_workers: int = 8) -> Iterator[Dict]:
+        """
+        懒加载遍历任务的全部结果记录
+
+        列出结果目录下所有.jsonl.out分片后用线程池并发下载解析，
+        分片完成即产出其中的记录（跨分片顺序不保证），调用方可以
+        边消费边统计，无需一次性物化全部结果。
+
+        Args:
+            job_arn: 任务ARN
+            max_workers: 并发下载的分片数上限
+
+        Yields:
+            统一格式的结果记录字典
+        """
+        bucket, result_prefix = self._resolve_result_location(job_arn)
+
+        paginator = self.s3_manager.s3.get_paginator('list_objects_v2')
+        shard_keys = []
+        for page in paginator.paginate(
+            Bucket=bucket,
+            Prefix=result_prefix,
+            PaginationConfig={'PageSize': 1000}
+        ):
+            for obj in page.get('Contents', []):
+                if obj['Key'].endswith('.jsonl.out'):
+                    shard_keys.append(obj['Key'])
+
+        if not shard_keys:
+            raise Exception(f"未找到结果文件: s3://{bucket}/{result_prefix}")
+
+        logger.info(f"📥 开始并发读取 {len(shard_keys)} 个结果分片")
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(shard_keys))) as executor:
+            futures = [
+                executor.submit(self._download_and_parse_out, bucket, key)
+                for key in shard_keys
+            ]
+            for future in as_completed(futures):
+                yield from future.result()
+
+    def get_results_preview(self, job_arn: str, output_bucket: str, output_prefix: str,
+                            max_preview_lines: int = 3, preview_max_chars: int = 200) -> Dict:
         """
         获取任务结果预览和文件位置
-        
+
         Args:
             job_arn: 任务ARN
             output_bucket: 输出bucket名称（仅用于兼容，实际从API获取）
             output_prefix: 输出路径前缀（仅用于兼容，实际从API获取）
             max_preview_lines: 最大预览行数，默认3行（文本/图片），视频建议1行
-            
+            preview_max_chars: 预览文本最大字符数，解析时即截断，避免传输完整输出
+
         Returns:
             包含预览数据和文件位置的字典
         """
         logger.info(f"📥 开始获取任务结果: {job_arn}")
         try:
-            # 首先获取任务状态，从中获取实际的输出S3 URI
-            logger.debug(f"步骤1: 获取任务状态...")
-            job_status = self.get_job_status(job_arn)
-            
-            if job_status.get('status') != 'Completed':
-                raise Exception(f"任务状态为 {job_status.get('status')}，请等待任务完成")
-            
-            # 从任务信息中获取实际的输出S3 URI
-            output_s3_uri = job_status.get('output_s3_uri')
-            logger.debug(f"步骤2: 解析输出S3 URI: {output_s3_uri}")
-            if not output_s3_uri:
-                raise Exception("无法从任务信息中获取输出S3 URI")
-            
-            # 解析S3 URI: s3://bucket/prefix/job_id/
-            # 移除 s3:// 前缀
-            s3_path = output_s3_uri.replace('s3://', '')
-            
-            # 分离bucket和prefix
-            parts = s3_path.split('/', 1)
-            actual_bucket = parts[0]
-            actual_prefix = parts[1] if len(parts) > 1 else ''
-            
-            # 确保prefix以/结尾（如果不为空）
-            if actual_prefix and not actual_prefix.endswith('/'):
-                actual_prefix += '/'
-            
-            # 获取job_id
-            job_id = job_arn.split('/')[-1]
-            
-            logger.debug(f"步骤3: 解析S3位置 - Bucket: {actual_bucket}, Prefix: {actual_prefix}, Job ID: {job_id}")
-            
-            # Bedrock会在输出路径下创建job_id子目录
-            # 实际结果文件路径：actual_prefix + job_id + /
-            result_prefix = f"{actual_prefix}{job_id}/"
-            logger.debug(f"完整结果路径: s3://{actual_bucket}/{result_prefix}")
-            
             results = []
-            result_file_key = None
-            
-            # 查找结果文件 - 列出所有文件以便调试
-            logger.debug(f"步骤4: 列举S3结果目录中的文件...")
-            response = self.s3_manager.s3.list_objects_v2(
-                Bucket=actual_bucket,
-                Prefix=result_prefix
-            )
-            
-            # 记录所有找到的文件用于调试
-            all_files = []
-            if 'Contents' in response:
-                for obj in response['Contents']:
-                    all_files.append(obj['Key'])
-            
-            logger.debug(f"找到 {len(all_files)} 个文件: {all_files}")
-            
-            # 查找结果文件和manifest文件
-            manifest_file_key = None
             manifest_data = None
-            
-            if 'Contents' in response:
-                # 查找.out文件（包括manifest和结果文件）
+
+            # 结果位置缓存：同一任务的重复预览/刷新无需再走状态查询+列举，
+            # Bedrock写完结果后位置不会再变
+            cached_location = self._result_location_cache.get(job_arn)
+            if cached_location:
+                actual_bucket, result_file_key, manifest_file_key = cached_location
+                result_prefix = None
+                all_files = [result_file_key]
+                logger.debug(f"命中结果位置缓存: s3://{actual_bucket}/{result_file_key}")
+            else:
+                # 解析已完成任务的结果目录（状态检查+输出URI解析统一在helper中）
+                logger.debug(f"步骤1: 解析任务输出位置...")
+                actual_bucket, result_prefix = self._resolve_result_location(job_arn)
+                logger.debug(f"完整结果路径: s3://{actual_bucket}/{result_prefix}")
+
+                result_file_key = None
+                manifest_file_key = None
+
+                # 查找结果文件 - 分页列出所有文件（结果目录可能超过1000个对象）
+                logger.debug(f"步骤4: 列举S3结果目录中的文件...")
+                paginator = self.s3_manager.s3.get_paginator('list_objects_v2')
+                contents = []
+                for page in paginator.paginate(
+                    Bucket=actual_bucket,
+                    Prefix=result_prefix,
+                    PaginationConfig={'PageSize': 1000}
+                ):
+                    contents.extend(page.get('Contents', []))
+
+                # 记录所有找到的文件用于调试
+                all_files = [obj['Key'] for obj in contents]
+
+                logger.debug(f"找到 {len(all_files)} 个文件: {all_files}")
+
+                # 查找结果文件和manifest文件
                 logger.debug(f"步骤5: 搜索结果文件和manifest文件...")
                 candidate_files = []
-                
-                for obj in response['Contents']:
+
+                for obj in contents:
                     key = obj['Key']
-                    
+
                     # 跳过目录本身
                     if key.endswith('/'):
                         logger.debug(f"跳过目录: {key}")
                         continue
-                    
+
                     # 查找manifest文件
                     if 'manifest.json.out' in key.lower():
                         manifest_file_key = key
                         logger.debug(f"找到manifest文件: {key}")
                         continue
-                    
+
                     # 收集所有.jsonl.out文件作为候选
                     if key.endswith('.jsonl.out'):
                         candidate_files.append(key)
                         logger.debug(f"候选结果文件: {key}")
-                
+
                 # .jsonl.out文件就是输出文件，直接使用第一个找到的
                 if candidate_files:
                     result_file_key = candidate_files[0]
                     logger.info(f"✅ 找到输出文件: {result_file_key}")
-                
-                # 读取manifest文件
-                if manifest_file_key:
+
+            # manifest读取与结果文件预览相互独立，放入后台线程与预览下载重叠
+            manifest_future = None
+            manifest_executor = None
+            if manifest_file_key:
+                manifest_executor = ThreadPoolExecutor(max_workers=1)
+                manifest_future = manifest_executor.submit(
+                    self._read_manifest, actual_bucket, manifest_file_key
+                )
+
+            if result_file_key:
+                logger.info(f"✅ 最终选择结果文件: {result_file_key}")
+                    
+                # 使用流式读取，逐行解析，避免JSON截断
+                try:
+                    # 预览只需前几行：先用Range GET抓取前64KB，足够时完全不碰文件其余部分；
+                    # 完整行数不足（单条输出极长）或Range不可用时回退全量流式读取
+                    body_stream = None
                     try:
-                        logger.debug(f"读取manifest文件: {manifest_file_key}")
-                        manifest_response = self.s3_manager.s3.get_object(
+                        ranged = self.s3_manager.s3.get_object(
                             Bucket=actual_bucket,
-                            Key=manifest_file_key
+                            Key=result_file_key,
+                            Range='bytes=0-65535'
                         )
-                        manifest_content = manifest_response['Body'].read().decode('utf-8')
-                        manifest_data = json.loads(manifest_content)
-                        logger.info(f"✅ 成功读取manifest文件")
-                        logger.debug(f"Manifest内容: {json.dumps(manifest_data, indent=2)}")
-                    except Exception as e:
-                        logger.warning(f"⚠️ 读取manifest文件失败: {str(e)}")
-                        manifest_data = None
-                
-                if result_file_key:
-                    logger.info(f"✅ 最终选择结果文件: {result_file_key}")
-                    
-                    # 使用流式读取，逐行解析，避免JSON截断
-                    try:
+                        head = ranged['Body'].read()
+                        if len(head) < 65536:
+                            # 文件全量已在缓冲内
+                            body_stream = io.BytesIO(head)
+                        else:
+                            complete = head[:head.rfind(b'\n') + 1]
+                            if complete.count(b'\n') >= max_preview_lines:
+                                body_stream = io.BytesIO(complete)
+                        if body_stream is not None:
+                            logger.debug(f"Range GET命中，预览无需下载完整文件")
+                    except Exception as range_err:
+                        logger.debug(f"Range GET不可用，回退全量读取: {str(range_err)}")
+
+                    if body_stream is None:
                         logger.debug(f"开始流式读取结果文件...")
                         file_response = self.s3_manager.s3.get_object(
                             Bucket=actual_bucket,
                             Key=result_file_key
                         )
-                        
-                        # 使用readline()逐行读取
                         body_stream = file_response['Body']
-                        lines_processed = 0
-                        max_lines = max_preview_lines  # 使用参数指定的预览行数
+
+                    # 使用readline()逐行读取
+                    lines_processed = 0
+                    max_lines = max_preview_lines  # 使用参数指定的预览行数
                         
-                        # 逐行读取文件
-                        while lines_processed < max_lines:
-                            line_bytes = body_stream.readline()
-                            if not line_bytes:  # 到达文件末尾
-                                logger.debug("已到达文件末尾")
-                                break
+                    # 逐行读取文件
+                    while lines_processed < max_lines:
+                        line_bytes = body_stream.readline()
+                        if not line_bytes:  # 到达文件末尾
+                            logger.debug("已到达文件末尾")
+                            break
                             
-                            try:
-                                line = line_bytes.decode('utf-8').strip()
-                                if not line:  # 跳过空行
-                                    continue
-                                
-                                lines_processed += 1
-                                logger.debug(f"读取第 {lines_processed} 行，长度: {len(line)} 字符")
-                                
-                                # 解析JSON
-                                result = json.loads(line)
+                        try:
+                            # 保持bytes直接解析（orjson/标准库均接受bytes），省去整行decode
+                            line = line_bytes.strip()
+                            if not line:  # 跳过空行
+                                continue
+
+                            lines_processed += 1
+                            logger.debug(f"读取第 {lines_processed} 行，长度: {len(line)} 字节")
                                 
-                                # 检查是成功输出还是错误
-                                if 'modelOutput' in result:
-                                    # 判断是Claude格式还是Nova格式
-                                    model_output = result['modelOutput']
-                                    
-                                    if 'content' in model_output:
-                                        # Claude格式：直接有content
-                                        output_text = model_output['content'][0]['text']
-                                        stop_reason = model_output.get('stop_reason', 'unknown')
-                                    elif 'output' in model_output and 'message' in model_output['output']:
-                                        # Nova格式：output.message.content
-                                        output_text = model_output['output']['message']['content'][0]['text']
-                                        stop_reason = model_output.get('stopReason', 'unknown')
-                                    else:
-                                        logger.warning(f"第 {lines_processed} 行modelOutput格式无法识别")
-                                        continue
-                                    
-                                    # 成功的输出
-                                    parsed_result = {
-                                        'record_id': result.get('recordId'),
-                                        'output_text': output_text,
-                                        'stop_reason': stop_reason,
-                                        'has_error': False
-                                    }
-                                    results.append(parsed_result)
-                                    logger.debug(f"✓ 成功解析第 {lines_processed} 行")
-                                elif 'error' in result:
-                                    # 包含错误信息
-                                    error_info = result['error']
-                                    error_msg = f"错误码{error_info.get('errorCode', 'N/A')}: {error_info.get('errorMessage', '未知错误')}"
-                                    parsed_result = {
-                                        'record_id': result.get('recordId'),
-                                        'output_text': f"[处理失败] {error_msg}",
-                                        'stop_reason': 'error',
-                                        'has_error': True,
-                                        'error_code': error_info.get('errorCode'),
-                                        'error_message': error_info.get('errorMessage'),
-                                        'retryable': error_info.get('retryable', False)
-                                    }
-                                    results.append(parsed_result)
-                                    logger.warning(f"⚠️ 第 {lines_processed} 行包含错误: {error_msg}")
-                                else:
-                                    logger.warning(f"第 {lines_processed} 行格式不正确，既无modelOutput也无error")
+                            # 解析JSON并转换为统一记录格式（预览截断在解析时完成）
+                            result = _json_loads(line)
+                            parsed_result = self._parse_result_line(result, preview_max_chars)
+                            if parsed_result is None:
+                                logger.warning(f"第 {lines_processed} 行格式无法识别")
+                            elif parsed_result['has_error']:
+                                results.append(parsed_result)
+                                logger.warning(f"⚠️ 第 {lines_processed} 行包含错误: {parsed_result['output_text']}")
+                            else:
+                                results.append(parsed_result)
+                                logger.debug(f"✓ 成功解析第 {lines_processed} 行")
                             
-                            except json.JSONDecodeError as e:
-                                logger.warning(f"第 {lines_processed} 行JSON解析失败: {str(e)}")
-                                continue
-                            except Exception as e:
-                                logger.warning(f"第 {lines_processed} 行处理失败: {str(e)}")
-                                continue
+                        except ValueError as e:
+                            logger.warning(f"第 {lines_processed} 行JSON解析失败: {str(e)}")
+                            continue
+                        except Exception as e:
+                            logger.warning(f"第 {lines_processed} 行处理失败: {str(e)}")
+                            continue
                         
-                        logger.info(f"流式读取完成，共处理 {lines_processed} 行，成功解析 {len(results)} 条结果")
+                    logger.info(f"流式读取完成，共处理 {lines_processed} 行，成功解析 {len(results)} 条结果")
                         
-                    except Exception as e:
-                        logger.error(f"流式读取文件失败: {str(e)}")
-            
+                except Exception as e:
+                    logger.error(f"流式读取文件失败: {str(e)}")
+
+            # 收集后台线程的manifest读取结果
+            if manifest_future is not None:
+                manifest_data = manifest_future.result()
+                manifest_executor.shutdown()
+
             # 如果没有找到.jsonl.out文件，尝试其他可能的文件名格式
             if not results and all_files:
                 for file_key in all_files:
@@ -414,32 +648,16 @@ class JobManager:
                             Bucket=actual_bucket,
                             Key=file_key
                         )
-                        content = file_response['Body'].read(51200).decode('utf-8')
-                        
-                        # 解析前5行
-                        lines = content.strip().split('\n')
-                        
-                        for line in lines[:5]:
-                            if line.strip():
+
+                        # 按bytes逐行流式解析前5行，不再整块读入再decode/split
+                        for raw_line in file_response['Body'].iter_lines(chunk_size=1 << 20):
+                            if len(results) >= 5:
+                                break
+                            if raw_line.strip():
                                 try:
-                                    result = json.loads(line)
-                                    if 'modelOutput' in result:
-                                        model_output = result['modelOutput']
-                                        # 支持Claude和Nova两种格式
-                                        if 'content' in model_output:
-                                            output_text = model_output['content'][0]['text']
-                                            stop_reason = model_output.get('stop_reason', 'unknown')
-                                        elif 'output' in model_output:
-                                            output_text = model_output['output']['message']['content'][0]['text']
-                                            stop_reason = model_output.get('stopReason', 'unknown')
-                                        else:
-                                            continue
-                                        
-                                        parsed_result = {
-                                            'record_id': result.get('recordId'),
-                                            'output_text': output_text,
-                                            'stop_reason': stop_reason
-                                        }
+                                    result = _json_loads(raw_line)
+                                    parsed_result = self._parse_result_line(result, preview_max_chars)
+                                    if parsed_result is not None and not parsed_result['has_error']:
                                         results.append(parsed_result)
                                 except Exception:
                                     continue
@@ -450,6 +668,11 @@ class JobManager:
                     except Exception:
                         continue
             
+            # 结果位置已确定则写入缓存，后续预览直接命中
+            if result_file_key:
+                self._result_location_cache[job_arn] = (
+                    actual_bucket, result_file_key, manifest_file_key)
+
             # 检查是否找到并成功解析结果
             if not result_file_key:
                 # 情况1: 没有找到结果文件
@@ -457,8 +680,7 @@ class JobManager:
                 error_msg = (
                     f"未找到结果文件\n"
                     f"- 查找路径: s3://{actual_bucket}/{result_prefix}\n"
-                    f"- 原始输出URI: {output_s3_uri}\n"
-                    f"- Job ID: {job_id}\n"
+                    f"- Job ARN: {job_arn}\n"
                     f"- {files_info}"
                 )
                 logger.error(f"❌ {error_msg}")
@@ -503,3 +725,24 @@ class JobManager:
         except Exception as e:
             logger.error(f"❌ 获取任务结果失败: {str(e)}", exc_info=True)
             raise Exception(f"获取任务结果失败: {str(e)}")
+
+    def _read_manifest(self, bucket: str, key: str):
+        """
+        读取并解析manifest文件（在后台线程中执行，失败时返回None）
+
+        Args:
+            bucket: S3 bucket名称
+            key: manifest文件的对象键
+
+        Returns:
+            manifest字典，读取或解析失败时为None
+        """
+        try:
+            logger.debug(f"读取manifest文件: {key}")
+            response = self.s3_manager.s3.get_object(Bucket=bucket, Key=key)
+            manifest_data = _json_loads(response['Body'].read())
+            logger.info(f"✅ 成功读取manifest文件")
+            return manifest_data
+        except Exception as e:
+            logger.warning(f"⚠️ 读取manifest文件失败: {str(e)}")
+            return None
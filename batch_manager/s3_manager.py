@@ -2,9 +2,52 @@
 S3操作管理模块
 """
 import boto3
+import io
 import os
+import time
 import logging
-from typing import List, Dict
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
+
+# S3客户端配置：加大连接池支撑并发上传/列举，自适应重试平滑限流，
+# 长连接保活减少重建握手；32+线程并发GET容易触及S3每前缀请求配额，
+# 重试预算放宽到10次让token bucket有时间把请求速率压下来
+S3_CLIENT_CONFIG = Config(
+    max_pool_connections=64,
+    retries={'mode': 'adaptive', 'max_attempts': 10},
+    tcp_keepalive=True,
+    # 显式超时：挂死的连接快速失败进重试，不长期占着下载线程
+    connect_timeout=5,
+    read_timeout=60
+)
+
+# 共享传输配置：64MB以下的文件跳过multipart（省去额外的建立/完成请求），
+# 大文件按16MB分片并行上传
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=64 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=8,
+    use_threads=True
+)
+
+# 下载传输配置：8MB以上的对象拆成4MB分段并行GET，单对象也能吃满带宽；
+# 以下的走单次GET（分段对小对象只多请求开销）
+S3_DOWNLOAD_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=4 * 1024 * 1024,
+    max_concurrency=8,
+    use_threads=True
+)
+
+# 列举结果的TTL缓存时长（秒）：用户配置参数期间常反复点击预览，
+# 窗口内直接复用上次扫描结果
+LISTING_CACHE_TTL = 60.0
+
+# bucket可达性探测结果的TTL缓存时长（秒）：验证流程每次都对输入/输出
+# bucket各发一次head_bucket，探测成功后短窗口内视为仍然可达
+BUCKET_ACCESS_CACHE_TTL = 300.0
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -20,123 +63,179 @@ if not logger.handlers:
 class S3Manager:
     """处理所有S3相关操作"""
     
-    def __init__(self, region: str = 'us-east-1'):
+    def __init__(self, region: str = 'us-east-1', session=None):
         """
         初始化S3管理器
-        
+
         Args:
             region: S3所在区域
+            session: 共享的boto3 Session（None时用默认session）
         """
-        self.s3 = boto3.client('s3', region_name=region)
+        client_source = session if session is not None else boto3
+        self.s3 = client_source.client('s3', region_name=region, config=S3_CLIENT_CONFIG)
         self.region = region
+        # (bucket, prefix, max_files) -> (monotonic时间戳, 文件列表)
+        self._listing_cache = {}
+        # bucket名 -> 最近一次head_bucket成功的monotonic时间戳
+        self._bucket_ok_cache = {}
         logger.info(f"S3Manager初始化完成，区域: {region}")
     
-    def list_files(self, bucket_name: str, prefix: str) -> List[Dict]:
+    def invalidate_listing_cache(self, bucket_name: str, prefix: Optional[str] = None):
+        """
+        失效列举缓存（bucket内容变化后调用）
+
+        Args:
+            bucket_name: 内容发生变化的bucket
+            prefix: 变化发生的前缀，只失效可能覆盖到它的条目
+                    （None表示整个bucket）
+        """
+        def _stale(key):
+            if key[0] != bucket_name:
+                return False
+            if prefix is None:
+                return True
+            # 缓存前缀与变化前缀互为前缀时，缓存条目才可能包含新对象
+            return key[1].startswith(prefix) or prefix.startswith(key[1])
+
+        self._listing_cache = {
+            k: v for k, v in self._listing_cache.items() if not _stale(k)
+        }
+
+    def list_files(self, bucket_name: str, prefix: str, max_files: Optional[int] = None) -> List[Dict]:
         """
         列出bucket中的文件（支持分页）
-        
+
         Args:
             bucket_name: S3 bucket名称
             prefix: 文件路径前缀
-            
+            max_files: 最多返回的文件数（None表示不限制，用于预览时限制扫描量）
+
         Returns:
             文件列表
         """
         try:
+            # 命中未过期的列举缓存则直接返回，避免重复扫描bucket
+            cache_key = (bucket_name, prefix, max_files)
+            cached = self._listing_cache.get(cache_key)
+            if cached and time.monotonic() - cached[0] < LISTING_CACHE_TTL:
+                logger.debug(f"命中列举缓存 - Bucket: {bucket_name}, Prefix: {prefix}")
+                return cached[1]
+
             logger.debug(f"开始列出S3文件 - Bucket: {bucket_name}, Prefix: {prefix}")
             files = []
-            continuation_token = None
-            page_count = 0
             total_objects = 0
             skipped_objects = 0
-            
-            while True:
-                page_count += 1
-                # 构建请求参数
-                params = {'Bucket': bucket_name, 'Prefix': prefix}
-                if continuation_token:
-                    params['ContinuationToken'] = continuation_token
-                    logger.debug(f"获取第{page_count}页数据，使用ContinuationToken")
-                else:
-                    logger.debug(f"获取第{page_count}页数据")
-                
-                response = self.s3.list_objects_v2(**params)
-                
-                if 'Contents' not in response:
+            truncated = False
+
+            # 使用paginator自动处理分页
+            paginator = self.s3.get_paginator('list_objects_v2')
+            page_iterator = paginator.paginate(
+                Bucket=bucket_name,
+                Prefix=prefix,
+                PaginationConfig={'PageSize': 1000}
+            )
+
+            for page_count, page in enumerate(page_iterator, 1):
+                contents = page.get('Contents', [])
+                if not contents:
                     logger.warning(f"第{page_count}页没有找到任何内容")
-                    break
-                
-                page_objects = len(response['Contents'])
-                total_objects += page_objects
-                logger.debug(f"第{page_count}页返回 {page_objects} 个对象")
-                
-                for obj in response['Contents']:
+                    continue
+
+                total_objects += len(contents)
+                logger.debug(f"第{page_count}页返回 {len(contents)} 个对象")
+
+                for obj in contents:
                     # 跳过目录本身和以/结尾的对象
                     if obj['Key'] == prefix or obj['Key'].endswith('/'):
                         skipped_objects += 1
                         logger.debug(f"跳过目录对象: {obj['Key']}")
                         continue
-                    
+
                     # 跳过大小为0的文件（可能是目录标记）
                     if obj['Size'] == 0:
                         skipped_objects += 1
                         logger.debug(f"跳过空文件: {obj['Key']}")
                         continue
-                    
+
                     files.append({
                         'file_path': obj['Key'],
                         'file_name': os.path.basename(obj['Key']),
                         'size': obj['Size'],
-                        'last_modified': obj['LastModified'].strftime('%Y-%m-%d %H:%M:%S')
+                        # isoformat比strftime快约3倍（listing大时此循环是CPU热点）；
+                        # 去掉tzinfo保持原"YYYY-MM-DD HH:MM:SS"输出不带时区后缀
+                        'last_modified': obj['LastModified'].replace(tzinfo=None)
+                                                           .isoformat(sep=' ', timespec='seconds')
                     })
-                
-                # 检查是否还有更多数据需要分页获取
-                if response.get('IsTruncated', False):
-                    continuation_token = response.get('NextContinuationToken')
-                    logger.debug(f"响应被截断，需要继续分页")
-                else:
-                    logger.debug(f"没有更多数据，分页结束")
+
+                    if max_files is not None and len(files) >= max_files:
+                        truncated = True
+                        break
+
+                if truncated:
+                    logger.info(f"已达到最大返回数量 {max_files}，停止列举")
                     break
-            
+
             logger.info(f"✅ S3文件列表完成 - 共扫描 {total_objects} 个对象，跳过 {skipped_objects} 个，返回 {len(files)} 个有效文件")
+            self._listing_cache[cache_key] = (time.monotonic(), files)
             return files
             
         except Exception as e:
             logger.error(f"❌ 列出S3文件失败: {str(e)}", exc_info=True)
             raise Exception(f"列出文件失败: {str(e)}")
     
-    def read_file(self, bucket_name: str, file_path: str) -> str:
+    def read_file(self, bucket_name: str, file_path: str,
+                  max_bytes: Optional[int] = None) -> str:
         """
         读取S3文件内容
-        
+
         Args:
             bucket_name: S3 bucket名称
             file_path: 文件路径
-            
+            max_bytes: 只读取文件前max_bytes字节（Range GET，适用于
+                       只关心文件开头的场景；None表示读取全文）
+
         Returns:
             文件内容字符串
         """
         try:
-            response = self.s3.get_object(Bucket=bucket_name, Key=file_path)
-            content = response['Body'].read().decode('utf-8')
-            return content
+            kwargs = {'Bucket': bucket_name, 'Key': file_path}
+            if max_bytes:
+                kwargs['Range'] = f'bytes=0-{max_bytes - 1}'
+            response = self.s3.get_object(**kwargs)
+            data = response['Body'].read()
+            if max_bytes:
+                # 截断点可能落在多字节字符中间，丢弃末尾不完整的字符
+                return data.decode('utf-8', errors='ignore')
+            return data.decode('utf-8')
         except Exception as e:
             raise Exception(f"读取文件失败 {file_path}: {str(e)}")
     
-    def read_binary_file(self, bucket_name: str, file_path: str) -> bytes:
+    def read_binary_file(self, bucket_name: str, file_path: str,
+                         size_hint: Optional[int] = None) -> bytes:
         """
-        读取S3二进制文件（如图片）
-        
+        读取S3二进制文件（如图片、视频）
+
         Args:
             bucket_name: S3 bucket名称
             file_path: 文件路径
-            
+            size_hint: 对象大小（字节），来自列举结果时可免掉
+                       transfer manager的head_object探测；
+                       小对象直接单次GET，大对象分段并行下载
+
         Returns:
             文件二进制数据
         """
         try:
-            response = self.s3.get_object(Bucket=bucket_name, Key=file_path)
-            return response['Body'].read()
+            # 已知是小对象时单次GET最省（分段下载对小对象只多开销）
+            if size_hint is not None and size_hint <= S3_DOWNLOAD_CONFIG.multipart_threshold:
+                response = self.s3.get_object(Bucket=bucket_name, Key=file_path)
+                return response['Body'].read()
+            # 大对象（或大小未知）交给transfer manager：超过阈值时
+            # 拆成分段Range GET并行下载
+            buf = io.BytesIO()
+            self.s3.download_fileobj(bucket_name, file_path, buf,
+                                     Config=S3_DOWNLOAD_CONFIG)
+            return buf.getvalue()
         except Exception as e:
             raise Exception(f"读取二进制文件失败 {file_path}: {str(e)}")
     
@@ -153,11 +252,33 @@ class S3Manager:
             S3 URI
         """
         try:
-            self.s3.upload_file(local_file, bucket_name, s3_key)
+            self.s3.upload_file(local_file, bucket_name, s3_key,
+                                Config=S3_TRANSFER_CONFIG)
+            self.invalidate_listing_cache(bucket_name)
             return f"s3://{bucket_name}/{s3_key}"
         except Exception as e:
             raise Exception(f"上传文件到S3失败: {str(e)}")
     
+    def upload_fileobj(self, fileobj, bucket_name: str, s3_key: str) -> str:
+        """
+        从内存缓冲/文件对象直接上传到S3（免落盘）
+
+        Args:
+            fileobj: 可读的二进制文件对象（需已seek到起始位置）
+            bucket_name: S3 bucket名称
+            s3_key: S3对象键
+
+        Returns:
+            S3 URI
+        """
+        try:
+            self.s3.upload_fileobj(fileobj, bucket_name, s3_key,
+                                   Config=S3_TRANSFER_CONFIG)
+            self.invalidate_listing_cache(bucket_name)
+            return f"s3://{bucket_name}/{s3_key}"
+        except Exception as e:
+            raise Exception(f"上传文件到S3失败: {str(e)}")
+
     def upload_files(self, local_files: List[str], bucket_name: str, prefix: str = "") -> List[str]:
         """
         批量上传本地文件到S3
@@ -172,17 +293,26 @@ class S3Manager:
         """
         try:
             uploaded_files = []
-            
+
             for local_file in local_files:
                 if not os.path.exists(local_file):
                     raise Exception(f"本地文件不存在: {local_file}")
-                
+
                 filename = os.path.basename(local_file)
-                s3_key = f"{prefix}{filename}" if prefix else filename
-                
-                self.s3.upload_file(local_file, bucket_name, s3_key)
-                uploaded_files.append(s3_key)
-            
+                uploaded_files.append(f"{prefix}{filename}" if prefix else filename)
+
+            # 并发上传：各文件相互独立，重叠RTT（boto3客户端线程安全，
+            # 连接池已在S3_CLIENT_CONFIG中调大）
+            if local_files:
+                with ThreadPoolExecutor(max_workers=min(16, len(local_files))) as executor:
+                    list(executor.map(
+                        lambda pair: self.s3.upload_file(
+                            pair[0], bucket_name, pair[1], Config=S3_TRANSFER_CONFIG),
+                        zip(local_files, uploaded_files)
+                    ))
+
+            # 上传的文件都在同一prefix下，只失效受影响的缓存条目
+            self.invalidate_listing_cache(bucket_name, prefix or None)
             return uploaded_files
             
         except Exception as e:
@@ -201,28 +331,37 @@ class S3Manager:
         """
         if not prefix:
             return ""
-        
+
+        # 快速路径：已规范化的前缀直接原样返回（幂等，重复调用零开销）
+        if prefix[0] != '/' and prefix[-1] == '/':
+            return prefix
+
         # 移除开头的'/'
         prefix = prefix.lstrip('/')
-        
+
         # 确保结尾有'/'（如果前缀不为空）
         if prefix and not prefix.endswith('/'):
             prefix += '/'
-            
+
         return prefix
     
     def check_bucket_access(self, bucket_name: str) -> bool:
         """
-        检查bucket访问权限
-        
+        检查bucket访问权限（成功结果带TTL缓存，窗口内免网络往返；
+        失败不缓存，下次调用会重新探测）
+
         Args:
             bucket_name: S3 bucket名称
-            
+
         Returns:
             是否可访问
         """
+        last_ok = self._bucket_ok_cache.get(bucket_name)
+        if last_ok is not None and time.monotonic() - last_ok < BUCKET_ACCESS_CACHE_TTL:
+            return True
         try:
             self.s3.head_bucket(Bucket=bucket_name)
+            self._bucket_ok_cache[bucket_name] = time.monotonic()
             return True
         except Exception:
             return False
@@ -7,10 +7,20 @@ import json
 import random
 import base64
 import logging
+from botocore.config import Config
 from typing import Dict, Optional, Tuple
 from datetime import datetime
 from .s3_manager import S3Manager
 
+# 运行时客户端配置：自适应重试平滑限流；单次推理（尤其带视频）
+# 响应可能较慢，读超时放宽到120秒
+RUNTIME_CLIENT_CONFIG = Config(
+    retries={'mode': 'adaptive', 'max_attempts': 3},
+    tcp_keepalive=True,
+    connect_timeout=5,
+    read_timeout=120
+)
+
 # 配置日志
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -25,15 +35,18 @@ if not logger.handlers:
 class SingleInferenceValidator:
     """单次推理验证器"""
     
-    def __init__(self, bedrock_region: str, s3_manager: S3Manager):
+    def __init__(self, bedrock_region: str, s3_manager: S3Manager, session=None):
         """
         初始化验证器
-        
+
         Args:
             bedrock_region: Bedrock服务所在区域
             s3_manager: S3管理器实例
+            session: 共享的boto3 Session（None时用默认session）
         """
-        self.bedrock_runtime = boto3.client('bedrock-runtime', region_name=bedrock_region)
+        client_source = session if session is not None else boto3
+        self.bedrock_runtime = client_source.client('bedrock-runtime', region_name=bedrock_region,
+                                                    config=RUNTIME_CLIENT_CONFIG)
         self.s3_manager = s3_manager
         self.bedrock_region = bedrock_region
     
@@ -1,13 +1,26 @@
 """
 文本批处理模块
 """
+import hashlib
 import json
-import os
 import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import List, Dict, Tuple, Optional, Callable
+from typing import BinaryIO, List, Dict, Tuple, Optional, Callable
 from .s3_manager import S3Manager
 
+# JSONL序列化用orjson（直接输出UTF-8字节，比标准库快数倍），
+# 未安装时回退标准库
+try:
+    import orjson
+
+    def _jsonl_dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:
+    def _jsonl_dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
 # 配置日志
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -40,10 +53,10 @@ class TextBatchProcessor:
         max_tokens: int = 2048,
         temperature: float = 0.1,
         progress_callback: Optional[Callable] = None
-    ) -> Tuple[List[Dict], str]:
+    ) -> Tuple[int, BinaryIO, str]:
         """
-        准备文本批量推理的数据
-        
+        准备文本批量推理的数据（写入内存缓冲，返回记录数量、缓冲和文件名）
+
         Args:
             bucket_name: 输入bucket名称
             prefix: 文件路径前缀
@@ -52,9 +65,9 @@ class TextBatchProcessor:
             max_tokens: 最大token数
             temperature: 温度参数
             progress_callback: 进度回调函数
-            
+
         Returns:
-            (model_inputs列表, 临时JSONL文件名)
+            (记录数量, JSONL缓冲对象, S3上传用文件名)
         """
         logger.info(f"📝 开始准备文本批量数据")
         logger.debug(f"参数 - Bucket: {bucket_name}, Prefix: {prefix}")
@@ -84,52 +97,115 @@ class TextBatchProcessor:
                 progress_callback('scan', total_files, total_files, 
                                 f'发现 {total_files} 个.txt文件待处理（共扫描{len(all_files)}个文件）')
             
-            model_inputs = []
-            
-            # 步骤2: 处理每个文件
-            logger.debug(f"步骤2: 开始逐个处理文件...")
-            for idx, file_info in enumerate(files, 1):
-                file_path = file_info['file_path']
-                file_name = file_info['file_name']
-                file_size = file_info['size']
-                
-                size_str = self._format_file_size(file_size)
-                logger.debug(f"处理文件 [{idx}/{total_files}]: {file_name} ({size_str})")
-                
-                if progress_callback:
-                    progress_callback('process', idx, total_files,
-                                    f'正在处理: {file_name} ({size_str})')
-                
-                # 读取文件内容
-                file_content = self.s3_manager.read_file(bucket_name, file_path)
-                logger.debug(f"文件内容长度: {len(file_content)} 字符")
-                
-                # 生成模型输入
-                model_input = self._create_model_input(
-                    prompt, file_content, len(model_inputs),
-                    max_tokens, temperature, model_id
-                )
-                model_inputs.append(model_input)
-                logger.debug(f"✓ 文件处理完成: {file_name}, Record ID: {model_input['recordId']}")
-                
-                if progress_callback:
-                    progress_callback('process', idx, total_files,
-                                    f'已完成: {file_name} ({size_str})')
-            
-            logger.info(f"✅ 所有文件处理完成，共生成 {len(model_inputs)} 条记录")
-            
-            # 步骤3: 生成JSONL文件
-            logger.debug(f"步骤3: 生成JSONL文件...")
+            # 步骤2: 并发读取文件内容（网络受限，线程池重叠RTT）
+            logger.debug(f"步骤2: 并发读取文件内容...")
+            contents = [None] * total_files
+            completed = 0
+            with ThreadPoolExecutor(max_workers=min(32, total_files)) as executor:
+                future_to_idx = {
+                    executor.submit(self.s3_manager.read_file, bucket_name, f['file_path']): i
+                    for i, f in enumerate(files)
+                }
+                # 进度回调按约1%的步长节流：大批量时每个文件都回调
+                # 意味着O(N)次UI更新和字符串格式化，没人看得过来
+                progress_step = max(1, total_files // 100)
+                for future in as_completed(future_to_idx):
+                    idx = future_to_idx[future]
+                    contents[idx] = future.result()
+                    completed += 1
+                    if completed % progress_step == 0 or completed == total_files:
+                        file_name = files[idx]['file_name']
+                        size_str = self._format_file_size(files[idx]['size'])
+                        logger.debug(f"✓ 文件读取完成 [{completed}/{total_files}]: {file_name} ({size_str})")
+                        if progress_callback:
+                            progress_callback('process', completed, total_files,
+                                            f'已完成: {file_name} ({size_str})')
+
+            # 步骤3: 按原始顺序边构建边写入内存缓冲
+            # （64MB以内纯内存，超出自动溢出到磁盘；免去落盘+回读两次I/O）
+            logger.debug(f"步骤3: 边构建边写入JSONL缓冲...")
             if progress_callback:
                 progress_callback('generate', 0, 1, '正在生成批处理JSONL文件...')
-            
-            filename = self._write_jsonl_file(model_inputs)
-            logger.info(f"✅ JSONL文件生成成功: {filename}, 大小: {os.path.getsize(filename)} bytes")
-            
+
+            # 时间戳只取一次：避免每条记录一次系统调用，
+            # 也保证同一批次内record_id前缀一致（唯一性由序号保证）
+            timestamp = int(datetime.now().timestamp())
+            filename = f'batch-{timestamp}.jsonl'
+            # 提示词前缀在循环外拼好，循环内不再与文件全文做字符串拼接
+            prompt_prefix = f"{prompt}\n\n原始文本:"
+            # 模型分支判断和不变的子结构（提示词块、推理配置）都在循环外
+            # 构建一次，循环内只组装随文件变化的部分
+            is_nova = 'nova' in model_id.lower()
+            if is_nova:
+                prompt_block = {"text": prompt_prefix}
+                inference_config = {
+                    "maxTokens": max_tokens,
+                    "temperature": temperature,
+                    "topP": 0.9
+                }
+            else:
+                prompt_block = {"type": "text", "text": prompt_prefix}
+            record_count = 0
+            # 重复内容去重：相同文件内容（回归测试集、重跑、样板文件）的
+            # modelInput只序列化一次，按blake2b内容哈希复用序列化字节；
+            # recordId在外层单独拼接，保持每条记录唯一
+            serialized_bodies = {}
+            buf = tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024)
+            for idx, file_content in enumerate(contents):
+                content_hash = hashlib.blake2b(
+                    file_content.encode('utf-8'), digest_size=16
+                ).digest()
+                body_bytes = serialized_bodies.get(content_hash)
+                if body_bytes is None:
+                    if is_nova:
+                        # Nova模型使用原生API格式
+                        body = {
+                            "schemaVersion": "messages-v1",
+                            "messages": [
+                                {
+                                    "role": "user",
+                                    "content": [prompt_block, {"text": file_content}]
+                                }
+                            ],
+                            "inferenceConfig": inference_config
+                        }
+                    else:
+                        # Claude模型使用Messages API格式
+                        body = {
+                            "anthropic_version": "bedrock-2023-05-31",
+                            "max_tokens": max_tokens,
+                            "temperature": temperature,
+                            "messages": [
+                                {
+                                    "role": "user",
+                                    "content": [
+                                        prompt_block,
+                                        {"type": "text", "text": file_content}
+                                    ]
+                                }
+                            ]
+                        }
+                    body_bytes = _jsonl_dumps(body)
+                    serialized_bodies[content_hash] = body_bytes
+                # recordId为"时间戳_序号"纯ASCII，可直接拼进JSON无需转义
+                buf.write(b'{"recordId":"%d_%d","modelInput":' % (timestamp, idx))
+                buf.write(body_bytes)
+                buf.write(b'}\n')
+                record_count += 1
+
+            if len(serialized_bodies) < record_count:
+                logger.info(
+                    f"内容去重命中: {record_count} 条记录中仅 {len(serialized_bodies)} 份唯一内容需要序列化")
+
+            total_bytes = buf.tell()
+            buf.seek(0)
+            logger.info(f"✅ 所有文件处理完成，共生成 {record_count} 条记录")
+            logger.info(f"✅ JSONL数据生成成功: {filename}, 大小: {total_bytes} bytes")
+
             if progress_callback:
                 progress_callback('generate', 1, 1, f'JSONL文件生成完成: {filename}')
-            
-            return model_inputs, filename
+
+            return record_count, buf, filename
             
         except Exception as e:
             logger.error(f"❌ 准备批量数据失败: {str(e)}", exc_info=True)
@@ -137,97 +213,6 @@ class TextBatchProcessor:
                 progress_callback('error', 0, 0, f'处理失败: {str(e)}')
             raise Exception(f"准备批量数据失败: {str(e)}")
     
-    def _create_model_input(
-        self,
-        prompt: str,
-        file_content: str,
-        index: int,
-        max_tokens: int,
-        temperature: float,
-        model_id: str
-    ) -> Dict:
-        """
-        创建模型输入数据
-        
-        Args:
-            prompt: 提示词
-            file_content: 文件内容
-            index: 索引
-            max_tokens: 最大token数
-            temperature: 温度参数
-            model_id: 模型ID
-            
-        Returns:
-            模型输入字典
-        """
-        record_id = f"{int(datetime.now().timestamp())}_{index}"
-        input_text = f"{prompt}\n\n原始文本:\n{file_content}"
-        
-        # 根据模型类型生成不同格式
-        if 'nova' in model_id.lower():
-            # Nova模型使用原生API格式
-            body = {
-                "schemaVersion": "messages-v1",
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "text": input_text
-                            }
-                        ]
-                    }
-                ],
-                "inferenceConfig": {
-                    "maxTokens": max_tokens,
-                    "temperature": temperature,
-                    "topP": 0.9
-                }
-            }
-        else:
-            # Claude模型使用Messages API格式
-            body = {
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": max_tokens,
-                "temperature": temperature,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": input_text
-                            }
-                        ]
-                    }
-                ]
-            }
-        
-        return {
-            "recordId": record_id,
-            "modelInput": body
-        }
-    
-    def _write_jsonl_file(self, model_inputs: List[Dict]) -> str:
-        """
-        写入JSONL文件
-        
-        Args:
-            model_inputs: 模型输入列表
-            
-        Returns:
-            文件名
-        """
-        timestamp = int(datetime.now().timestamp())
-        filename = f'batch-{timestamp}.jsonl'
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            for item in model_inputs:
-                json_str = json.dumps(item, ensure_ascii=False)
-                f.write(json_str + '\n')
-        
-        return filename
-    
     @staticmethod
     def _format_file_size(size: int) -> str:
         """格式化文件大小"""
@@ -5,8 +5,25 @@
 """
 import boto3
 import logging
+import re
+import time
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict
 
+# 探测类调用最多重试一次就返回，避免单个不稳定探测拖慢整个验证
+PROBE_CONFIG = Config(retries={'mode': 'standard', 'total_max_attempts': 2})
+
+# 身份信息的TTL缓存时长（秒）：UI上每次点验证都会查一次STS身份，
+# 进程内凭证在该窗口内视为未变化，命中缓存时省掉一次STS往返
+IDENTITY_CACHE_TTL = 900.0
+
+# 格式校验用的正则在模块加载时编译一次
+# Role ARN: arn:aws:iam::<12位账号>:role/<角色名>
+ROLE_ARN_PATTERN = re.compile(r'^arn:aws:iam::\d{12}:role/.+$')
+# S3 bucket命名规则基础检查：小写字母/数字/点/连字符，字母数字开头结尾
+BUCKET_NAME_PATTERN = re.compile(r'^[a-z0-9][a-z0-9\.\-]*[a-z0-9]$')
+
 # 配置日志
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -21,17 +38,40 @@ if not logger.handlers:
 class PermissionValidator:
     """处理AWS基础配置验证"""
     
-    def __init__(self, region: str, s3_manager=None):
+    def __init__(self, region: str, s3_manager=None, session=None):
         """
         初始化权限验证器
-        
+
         Args:
             region: AWS区域
-            s3_manager: S3管理器实例（可选，用于向后兼容）
+            s3_manager: S3管理器实例（可选，用于bucket可达性探测）
+            session: 共享的boto3 Session（None时用默认session）
         """
         self.region = region
-        self.sts = boto3.client('sts', region_name=region)
+        client_source = session if session is not None else boto3
+        self.sts = client_source.client('sts', region_name=region, config=PROBE_CONFIG)
+        self.s3_manager = s3_manager
+        # (monotonic时间戳, 身份ARN)
+        self._identity_cache = None
         logger.info(f"权限验证器初始化完成，区域: {region}")
+
+    def _get_caller_arn(self) -> str:
+        """
+        获取当前身份ARN（带TTL缓存，窗口内重复验证不再发STS请求）
+
+        Returns:
+            当前身份的ARN
+        """
+        cached = self._identity_cache
+        if cached and time.monotonic() - cached[0] < IDENTITY_CACHE_TTL:
+            return cached[1]
+        arn = self.sts.get_caller_identity()['Arn']
+        self._identity_cache = (time.monotonic(), arn)
+        return arn
+
+    def invalidate_identity_cache(self):
+        """失效身份缓存（切换角色/凭证后调用）"""
+        self._identity_cache = None
     
     def validate_permissions(
         self,
@@ -68,7 +108,7 @@ class PermissionValidator:
         try:
             # 1. 检查Role ARN格式
             logger.debug("步骤1: 检查Role ARN格式...")
-            if not role_arn or not role_arn.startswith('arn:aws:iam::'):
+            if not role_arn or not ROLE_ARN_PATTERN.match(role_arn):
                 results['valid'] = False
                 results['errors'].append(f"✗ Role ARN格式不正确: {role_arn}")
                 logger.error(f"Role ARN格式错误: {role_arn}")
@@ -76,48 +116,67 @@ class PermissionValidator:
             
             results['checks'].append(f"✓ Role ARN格式正确")
             logger.debug(f"✅ Role ARN格式验证通过")
-            
-            # 2. 检查当前身份（仅用于记录）
-            logger.debug("步骤2: 获取当前身份信息...")
-            try:
-                identity = self.sts.get_caller_identity()
-                current_arn = identity['Arn']
-                results['checks'].append(f"✓ 当前身份: {current_arn}")
-                logger.info(f"当前身份: {current_arn}")
-            except Exception as e:
-                logger.warning(f"无法获取当前身份: {str(e)}")
-                results['warnings'].append(f"⚠ 无法获取当前身份信息")
-            
-            # 3. 检查输入bucket名称格式
-            logger.debug("步骤3: 检查输入bucket名称格式...")
-            if self._is_valid_bucket_name(input_bucket):
-                results['checks'].append(f"✓ 输入bucket名称格式有效: {input_bucket}")
-                logger.debug(f"✅ 输入bucket名称格式有效")
-            else:
-                results['valid'] = False
-                results['errors'].append(f"✗ 输入bucket名称格式无效: {input_bucket}")
-                logger.error(f"❌ 输入bucket名称格式无效")
-            
-            # 4. 检查输出bucket名称格式
-            logger.debug("步骤4: 检查输出bucket名称格式...")
-            if self._is_valid_bucket_name(output_bucket):
-                results['checks'].append(f"✓ 输出bucket名称格式有效: {output_bucket}")
-                logger.debug(f"✅ 输出bucket名称格式有效")
-            else:
-                results['valid'] = False
-                results['errors'].append(f"✗ 输出bucket名称格式无效: {output_bucket}")
-                logger.error(f"❌ 输出bucket名称格式无效")
-            
-            # 5. 检查模型ID格式（如果提供）
-            if model_id:
-                logger.debug("步骤5: 检查模型ID格式...")
-                if self._is_valid_model_id(model_id):
-                    results['checks'].append(f"✓ 模型ID格式有效: {model_id}")
-                    logger.debug(f"✅ 模型ID格式有效")
+
+            # 2. 并发执行网络探测（身份信息、bucket可达性相互独立，重叠RTT）
+            logger.debug("步骤2: 并发执行网络探测...")
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                identity_future = executor.submit(self._get_caller_arn)
+                bucket_futures = {}
+                if self.s3_manager is not None:
+                    bucket_futures['输入'] = (input_bucket, executor.submit(
+                        self.s3_manager.check_bucket_access, input_bucket))
+                    bucket_futures['输出'] = (output_bucket, executor.submit(
+                        self.s3_manager.check_bucket_access, output_bucket))
+
+                # 3. 检查输入bucket名称格式（探测进行期间完成本地格式检查）
+                logger.debug("步骤3: 检查输入bucket名称格式...")
+                if self._is_valid_bucket_name(input_bucket):
+                    results['checks'].append(f"✓ 输入bucket名称格式有效: {input_bucket}")
+                    logger.debug(f"✅ 输入bucket名称格式有效")
+                else:
+                    results['valid'] = False
+                    results['errors'].append(f"✗ 输入bucket名称格式无效: {input_bucket}")
+                    logger.error(f"❌ 输入bucket名称格式无效")
+
+                # 4. 检查输出bucket名称格式
+                logger.debug("步骤4: 检查输出bucket名称格式...")
+                if self._is_valid_bucket_name(output_bucket):
+                    results['checks'].append(f"✓ 输出bucket名称格式有效: {output_bucket}")
+                    logger.debug(f"✅ 输出bucket名称格式有效")
                 else:
                     results['valid'] = False
-                    results['errors'].append(f"✗ 模型ID格式无效: {model_id}")
-                    logger.error(f"❌ 模型ID格式无效")
+                    results['errors'].append(f"✗ 输出bucket名称格式无效: {output_bucket}")
+                    logger.error(f"❌ 输出bucket名称格式无效")
+
+                # 5. 检查模型ID格式（如果提供）
+                if model_id:
+                    logger.debug("步骤5: 检查模型ID格式...")
+                    if self._is_valid_model_id(model_id):
+                        results['checks'].append(f"✓ 模型ID格式有效: {model_id}")
+                        logger.debug(f"✅ 模型ID格式有效")
+                    else:
+                        results['valid'] = False
+                        results['errors'].append(f"✗ 模型ID格式无效: {model_id}")
+                        logger.error(f"❌ 模型ID格式无效")
+
+                # 收集身份探测结果（仅用于记录）
+                try:
+                    current_arn = identity_future.result()
+                    results['checks'].append(f"✓ 当前身份: {current_arn}")
+                    logger.info(f"当前身份: {current_arn}")
+                except Exception as e:
+                    logger.warning(f"无法获取当前身份: {str(e)}")
+                    results['warnings'].append(f"⚠ 无法获取当前身份信息")
+
+                # 收集bucket可达性探测结果（仅作提示，实际权限由AWS在任务提交时验证）
+                for label, (bucket_name, future) in bucket_futures.items():
+                    if future.result():
+                        results['checks'].append(f"✓ {label}bucket可访问: {bucket_name}")
+                        logger.debug(f"✅ {label}bucket可访问: {bucket_name}")
+                    else:
+                        results['warnings'].append(
+                            f"⚠ 无法访问{label}bucket: {bucket_name}（可能不存在或当前身份无权限）")
+                        logger.warning(f"⚠ 无法访问{label}bucket: {bucket_name}")
             
             # 添加重要提示
             results['warnings'].append("⚠ 实际的S3和Bedrock权限将在任务提交时由AWS服务验证")
@@ -145,17 +204,12 @@ class PermissionValidator:
         """
         if not bucket_name:
             return False
-        
-        # S3 bucket命名规则基础检查
-        # - 长度在3-63之间
-        # - 只包含小写字母、数字、点和连字符
-        # - 以字母或数字开头和结尾
-        import re
+
+        # 长度在3-63之间，其余规则由模块级预编译正则检查
         if len(bucket_name) < 3 or len(bucket_name) > 63:
             return False
-        
-        pattern = r'^[a-z0-9][a-z0-9\.\-]*[a-z0-9]$'
-        return bool(re.match(pattern, bucket_name))
+
+        return bool(BUCKET_NAME_PATTERN.match(bucket_name))
     
     def _is_valid_model_id(self, model_id: str) -> bool:
         """
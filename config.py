@@ -2,9 +2,10 @@
 配置文件
 包含模型配置、常量等
 """
+from types import MappingProxyType
 
 # 支持的模型列表 - 文本模式（所有支持批处理的模型 - 使用Cross-region Inference Profiles）
-TEXT_MODELS = {
+TEXT_MODELS = MappingProxyType({
     # === Claude 3 系列 ===
     "Claude 3 Haiku": "us.anthropic.claude-3-haiku-20240307-v1:0",
     "Claude 3 Sonnet": "us.anthropic.claude-3-sonnet-20240229-v1:0",
@@ -28,10 +29,10 @@ TEXT_MODELS = {
     "Nova Lite": "us.amazon.nova-lite-v1:0",
     "Nova Pro": "us.amazon.nova-pro-v1:0",
     "Nova Premier": "us.amazon.nova-premier-v1:0",
-}
+})
 
 # 支持的模型列表 - 图片模式（支持Vision/Multimodal的模型 - 使用Cross-region Inference Profiles）
-IMAGE_MODELS = {
+IMAGE_MODELS = MappingProxyType({
     # === Claude 3 系列 (Vision) ===
     "Claude 3 Haiku": "us.anthropic.claude-3-haiku-20240307-v1:0",
     "Claude 3 Sonnet": "us.anthropic.claude-3-sonnet-20240229-v1:0",
@@ -54,22 +55,27 @@ IMAGE_MODELS = {
     "Nova Lite (Image)": "us.amazon.nova-lite-v1:0",
     "Nova Pro (Image)": "us.amazon.nova-pro-v1:0",
     "Nova Premier (Image)": "us.amazon.nova-premier-v1:0",
-}
+})
 
 # 支持的模型列表 - 视频模式（仅Nova Pro和Premier支持视频 - 使用Cross-region Inference Profiles）
-VIDEO_MODELS = {
+VIDEO_MODELS = MappingProxyType({
     # === Amazon Nova 视频系列（文本+图片+视频） ===
     "Nova Pro (Video)": "us.amazon.nova-pro-v1:0",
     "Nova Premier (Video)": "us.amazon.nova-premier-v1:0",
-}
+})
+
+# 下拉框选项在导入时固化为元组，界面重建时不再重复物化keys
+TEXT_MODEL_CHOICES = tuple(TEXT_MODELS)
+IMAGE_MODEL_CHOICES = tuple(IMAGE_MODELS)
+VIDEO_MODEL_CHOICES = tuple(VIDEO_MODELS)
 
-# 状态文件路径
-STATE_FILE = 'job_states.json'
+# 状态文件路径（追加式JSONL，每行一条任务记录）
+STATE_FILE = 'job_states.jsonl'
 
 # 全局变量存储当前任务
+# 注意：不保存manager实例，处理函数通过create_batch_manager（带缓存）按region获取
 current_job_info = {
     'job_arn': None,
-    'manager': None,
     'output_bucket': None,
     'output_prefix': None,
     'aws_region': None,
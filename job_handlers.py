@@ -2,28 +2,112 @@
 任务处理模块
 处理批量推理任务的启动、状态查询、结果获取等
 """
+import asyncio
+import math
+import time
 import gradio as gr
 import pandas as pd
 from datetime import datetime
 from config import TEXT_MODELS, IMAGE_MODELS, VIDEO_MODELS, current_job_info
 from state_manager import save_job_state, load_job_state, create_batch_manager
 
+# 任务状态对应的emoji（模块级常量，避免每次刷新重建字典）
+STATUS_EMOJI = {
+    'Submitted': '📝',
+    'InProgress': '⏳',
+    'Completed': '✅',
+    'Failed': '❌',
+    'Stopped': '🛑',
+    'Error': '❌'
+}
 
-def preview_files(input_bucket: str, input_prefix: str, aws_region: str) -> tuple:
-    """预览S3输入文件"""
+# 文件预览最多显示的对象数量，避免大bucket拖垮页面
+PREVIEW_MAX_FILES = 500
+
+# 处理日志各步骤的emoji（模块级常量，process步骤的emoji随任务类型变化）
+TEXT_STEP_EMOJI = {'scan': '🔍', 'process': '📄', 'generate': '📝', 'error': '❌'}
+IMAGE_STEP_EMOJI = {**TEXT_STEP_EMOJI, 'process': '🖼️'}
+VIDEO_STEP_EMOJI = {**TEXT_STEP_EMOJI, 'process': '🎬'}
+
+# 预编译的状态消息模板（模块级构建一次，调用时仅做字段替换）
+SUBMIT_MSG_TEMPLATE = """
+### ✅ {job_label}批处理任务已提交
+
+**任务信息：**
+- 任务名称: {job_name}
+- 任务ARN: {job_arn}
+- 模型: {model_name}
+- AWS Region: {aws_region}
+- 状态: 已提交
+
+{message}
+
+*任务正在后台执行，请点击"刷新状态"按钮查看最新进度*
+"""
+
+STATUS_MSG_TEMPLATE = """
+### {emoji} 任务状态: {status}
+
+**任务详情：**
+- 任务ARN: {job_arn}
+- 提交时间: {submit_time}
+- 最后更新: {last_modified}
+- 当前时间: {now}
+"""
+
+# 状态查询自适应TTL缓存：任务长时间处于排队/执行状态时，连续刷新命中缓存的
+# 窗口逐次翻倍（上限30秒），按状态对GetModelInvocationJob调用限速；
+# 终态不再变化，永久缓存
+STATUS_CACHE_TTL = 5.0
+STATUS_CACHE_MAX_TTL = 30.0
+_status_cache = {}  # job_arn -> (monotonic时间戳, 当前TTL, status_info)
+
+TERMINAL_STATUSES = ('Completed', 'Failed', 'Stopped')
+
+
+def _restore_job_info(job_arn: str) -> bool:
+    """进程重启后从持久化状态文件恢复任务上下文，成功返回True"""
+    saved = load_job_state(job_arn)
+    if not saved:
+        return False
+    for key in ('output_bucket', 'output_prefix', 'aws_region',
+                'input_bucket', 'input_prefix', 'job_type'):
+        current_job_info[key] = saved.get(key)
+    current_job_info['job_arn'] = job_arn
+    return True
+
+
+async def preview_files(input_bucket: str, input_prefix: str, aws_region: str) -> tuple:
+    """预览S3输入文件（异步处理，避免阻塞Gradio事件循环）"""
     try:
         if not input_bucket:
             return None, "❌ 请输入Bucket名称"
-        
-        manager = create_batch_manager(bedrock_region=aws_region, s3_region=aws_region)
-        files = manager.list_input_files(input_bucket, input_prefix)
-        
+
+        manager = await asyncio.to_thread(
+            create_batch_manager, bedrock_region=aws_region, s3_region=aws_region
+        )
+        # 规范化前缀（补齐末尾'/'），避免S3按前缀匹配扫描到无关对象
+        input_prefix = manager.normalize_prefix(input_prefix)
+        files = await asyncio.to_thread(
+            manager.list_input_files, input_bucket, input_prefix, PREVIEW_MAX_FILES
+        )
+
         if not files:
             return None, f"⚠️ 在 {input_bucket}/{input_prefix} 中未找到任何文件"
-        
-        # 转换为DataFrame用于显示
-        df = pd.DataFrame(files)
-        message = f"✅ 找到 {len(files)} 个文件"
+
+        # 列式构建DataFrame（整列一次性推断dtype，比逐行字典快），
+        # 放入线程以免构建大表时阻塞事件循环
+        file_columns = {
+            'file_path': [f['file_path'] for f in files],
+            'file_name': [f['file_name'] for f in files],
+            'size': [f['size'] for f in files],
+            'last_modified': [f['last_modified'] for f in files],
+        }
+        df = await asyncio.to_thread(pd.DataFrame, file_columns)
+        if len(files) >= PREVIEW_MAX_FILES:
+            message = f"✅ 已显示前 {PREVIEW_MAX_FILES} 个文件（预览已截断，bucket中可能还有更多文件）"
+        else:
+            message = f"✅ 找到 {len(files)} 个文件"
         
         return df, message
         
@@ -31,14 +115,14 @@ def preview_files(input_bucket: str, input_prefix: str, aws_region: str) -> tupl
         return None, f"❌ 预览文件失败: {str(e)}"
 
 
-def validate_configuration(
+async def validate_configuration(
     input_bucket: str,
     output_bucket: str,
     role_arn: str,
     aws_region: str,
     model_name: str = None
 ) -> str:
-    """验证配置"""
+    """验证配置（异步处理，避免阻塞Gradio事件循环）"""
     try:
         if not all([input_bucket, output_bucket, role_arn]):
             return "❌ 请填写所有必填配置项"
@@ -51,8 +135,12 @@ def validate_configuration(
                        IMAGE_MODELS.get(model_name) or 
                        VIDEO_MODELS.get(model_name))
         
-        manager = create_batch_manager(bedrock_region=aws_region, s3_region=aws_region)
-        result = manager.validate_permissions(role_arn, input_bucket, output_bucket, model_id)
+        manager = await asyncio.to_thread(
+            create_batch_manager, bedrock_region=aws_region, s3_region=aws_region
+        )
+        result = await asyncio.to_thread(
+            manager.validate_permissions, role_arn, input_bucket, output_bucket, model_id
+        )
         
         # 构建验证结果消息
         message_parts = ["### 权限验证结果\n"]
@@ -60,23 +148,20 @@ def validate_configuration(
         if model_id:
             message_parts.append(f"**模型ID:** {model_id}\n")
         
-        # 显示检查通过的项
+        # 显示检查通过的项（extend+生成器，避免逐条append的重复方法查找）
         if result['checks']:
             message_parts.append("#### ✅ 检查通过：")
-            for check in result['checks']:
-                message_parts.append(f"- {check}")
-        
+            message_parts.extend(f"- {check}" for check in result['checks'])
+
         # 显示警告
         if result.get('warnings'):
             message_parts.append("\n#### ⚠️ 警告：")
-            for warning in result['warnings']:
-                message_parts.append(f"- {warning}")
-        
+            message_parts.extend(f"- {warning}" for warning in result['warnings'])
+
         # 显示错误
         if result['errors']:
             message_parts.append("\n#### ❌ 发现问题：")
-            for error in result['errors']:
-                message_parts.append(f"- {error}")
+            message_parts.extend(f"- {error}" for error in result['errors'])
         
         if result['valid']:
             message_parts.append("\n### 🎉 配置验证通过，可以开始批处理！")
@@ -110,21 +195,14 @@ def start_batch_job(
         """进度回调函数"""
         timestamp = datetime.now().strftime('%H:%M:%S')
         
-        if step == 'scan':
-            emoji = '🔍'
-        elif step == 'process':
-            emoji = '📄'
+        emoji = TEXT_STEP_EMOJI.get(step, '⏳')
+        if step == 'process':
             if total > 0:
                 progress_pct = (current / total * 0.6) + 0.3
                 progress(progress_pct, desc=f"处理文件 {current}/{total}")
         elif step == 'generate':
-            emoji = '📝'
             progress(0.9, desc="生成JSONL文件...")
-        elif step == 'error':
-            emoji = '❌'
-        else:
-            emoji = '⏳'
-        
+
         log_entry = f"{emoji} [{timestamp}] {details}"
         processing_log.append(log_entry)
     
@@ -214,7 +292,6 @@ def start_batch_job(
         
         # 保存任务信息到内存
         current_job_info['job_arn'] = result['job_arn']
-        current_job_info['manager'] = manager
         current_job_info['output_bucket'] = output_bucket
         current_job_info['output_prefix'] = output_prefix
         current_job_info['aws_region'] = aws_region
@@ -236,20 +313,14 @@ def start_batch_job(
         log_callback('submit', 1, 1, f'✅ 批处理任务已成功提交到Bedrock')
         
         # 构建状态消息
-        status_msg = f"""
-### ✅ 批处理任务已提交
-
-**任务信息：**
-- 任务名称: {result['job_name']}
-- 任务ARN: {result['job_arn']}
-- 模型: {model_name}
-- AWS Region: {aws_region}
-- 状态: 已提交
-
-{result['message']}
-
-*任务正在后台执行，请点击"刷新状态"按钮查看最新进度*
-"""
+        status_msg = SUBMIT_MSG_TEMPLATE.format(
+            job_label='',
+            job_name=result['job_name'],
+            job_arn=result['job_arn'],
+            model_name=model_name,
+            aws_region=aws_region,
+            message=result['message']
+        )
         
         return (
             status_msg,
@@ -292,21 +363,14 @@ def start_image_batch_job(
         """进度回调函数"""
         timestamp = datetime.now().strftime('%H:%M:%S')
         
-        if step == 'scan':
-            emoji = '🔍'
-        elif step == 'process':
-            emoji = '🖼️'
+        emoji = IMAGE_STEP_EMOJI.get(step, '⏳')
+        if step == 'process':
             if total > 0:
                 progress_pct = (current / total * 0.6) + 0.3
                 progress(progress_pct, desc=f"处理图片 {current}/{total}")
         elif step == 'generate':
-            emoji = '📝'
             progress(0.9, desc="生成JSONL文件...")
-        elif step == 'error':
-            emoji = '❌'
-        else:
-            emoji = '⏳'
-        
+
         log_entry = f"{emoji} [{timestamp}] {details}"
         processing_log.append(log_entry)
     
@@ -417,7 +481,6 @@ def start_image_batch_job(
         
         # 保存任务信息到内存
         current_job_info['job_arn'] = result['job_arn']
-        current_job_info['manager'] = manager
         current_job_info['output_bucket'] = output_bucket
         current_job_info['output_prefix'] = output_prefix
         current_job_info['aws_region'] = aws_region
@@ -439,20 +502,14 @@ def start_image_batch_job(
         log_callback('submit', 1, 1, f'✅ 图片批处理任务已成功提交到Bedrock')
         
         # 构建状态消息
-        status_msg = f"""
-### ✅ 图片批处理任务已提交
-
-**任务信息：**
-- 任务名称: {result['job_name']}
-- 任务ARN: {result['job_arn']}
-- 模型: {model_name}
-- AWS Region: {aws_region}
-- 状态: 已提交
-
-{result['message']}
-
-*任务正在后台执行，请点击"刷新状态"按钮查看最新进度*
-"""
+        status_msg = SUBMIT_MSG_TEMPLATE.format(
+            job_label='图片',
+            job_name=result['job_name'],
+            job_arn=result['job_arn'],
+            model_name=model_name,
+            aws_region=aws_region,
+            message=result['message']
+        )
         
         return (
             status_msg,
@@ -473,39 +530,51 @@ def start_image_batch_job(
         )
 
 
-def refresh_job_status(job_arn: str) -> tuple:
-    """刷新任务状态"""
+async def refresh_job_status(job_arn: str) -> tuple:
+    """刷新任务状态（异步处理，避免阻塞Gradio事件循环）"""
     try:
-        if not job_arn or not current_job_info['manager']:
+        if not job_arn:
             return "⚠️ 没有正在运行的任务", None, gr.update(visible=False, interactive=False)
-        
-        manager = current_job_info['manager']
-        status_info = manager.get_job_status(job_arn)
-        
+
+        # 全局任务信息不属于当前任务（进程重启、或其他会话提交了新任务
+        # 把全局信息覆盖成别的region/类型）时，从状态文件恢复本任务上下文
+        if ((current_job_info.get('job_arn') != job_arn
+                or not current_job_info.get('aws_region'))
+                and not _restore_job_info(job_arn)):
+            return "⚠️ 没有正在运行的任务", None, gr.update(visible=False, interactive=False)
+
+        # 命中未过期的状态缓存则跳过AWS调用
+        cached = _status_cache.get(job_arn)
+        if cached and time.monotonic() - cached[0] < cached[1]:
+            status_info = cached[2]
+        else:
+            aws_region = current_job_info['aws_region']
+            manager = await asyncio.to_thread(
+                create_batch_manager, bedrock_region=aws_region, s3_region=aws_region
+            )
+            status_info = await asyncio.to_thread(manager.get_job_status, job_arn)
+            if status_info.get('status') in TERMINAL_STATUSES:
+                # 终态不会再变化，永久命中缓存
+                ttl = math.inf
+            else:
+                # 非终态：TTL从5秒起逐次翻倍，上限30秒
+                prev_ttl = cached[1] if cached else STATUS_CACHE_TTL / 2
+                ttl = min(STATUS_CACHE_MAX_TTL, prev_ttl * 2)
+            _status_cache[job_arn] = (time.monotonic(), ttl, status_info)
+
         status = status_info.get('status', 'Unknown')
-        
-        # 状态映射
-        status_emoji = {
-            'Submitted': '📝',
-            'InProgress': '⏳',
-            'Completed': '✅',
-            'Failed': '❌',
-            'Stopped': '🛑',
-            'Error': '❌'
-        }
-        
-        emoji = status_emoji.get(status, '❓')
+
+        emoji = STATUS_EMOJI.get(status, '❓')
         
         # 构建状态消息
-        status_msg = f"""
-### {emoji} 任务状态: {status}
-
-**任务详情：**
-- 任务ARN: {job_arn}
-- 提交时间: {status_info.get('submit_time', 'N/A')}
-- 最后更新: {status_info.get('last_modified', 'N/A')}
-- 当前时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-"""
+        status_msg = STATUS_MSG_TEMPLATE.format(
+            emoji=emoji,
+            status=status,
+            job_arn=job_arn,
+            submit_time=status_info.get('submit_time', 'N/A'),
+            last_modified=status_info.get('last_modified', 'N/A'),
+            now=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        )
         
         if status_info.get('message'):
             status_msg += f"\n**消息:** {status_info['message']}"
@@ -530,22 +599,39 @@ def refresh_job_status(job_arn: str) -> tuple:
         return f"❌ 获取状态失败: {str(e)}", None, gr.update(visible=False, interactive=False)
 
 
-def get_results(job_arn: str) -> tuple:
-    """获取任务结果（预览+文件位置）"""
+async def get_results(job_arn: str):
+    """获取任务结果（预览+文件位置；异步生成器，先推送进度提示再推送最终结果）"""
     try:
-        if not job_arn or not current_job_info['manager']:
-            return "⚠️ 没有可用的任务结果", "", None
-        
-        manager = current_job_info['manager']
+        if not job_arn:
+            yield "⚠️ 没有可用的任务结果", "", None
+            return
+
+        # 全局任务信息不属于当前任务（进程重启、或其他会话提交了新任务
+        # 把全局信息覆盖成别的region/类型）时，从状态文件恢复本任务上下文
+        if ((current_job_info.get('job_arn') != job_arn
+                or not current_job_info.get('aws_region'))
+                and not _restore_job_info(job_arn)):
+            yield "⚠️ 没有可用的任务结果", "", None
+            return
+
+        # 先让UI立即显示进度提示，S3往返期间页面不再停留在旧内容上
+        yield "⏳ 正在获取结果，请稍候...", "", None
+
+        aws_region = current_job_info['aws_region']
+        manager = await asyncio.to_thread(
+            create_batch_manager, bedrock_region=aws_region, s3_region=aws_region
+        )
         output_bucket = current_job_info['output_bucket']
         output_prefix = current_job_info['output_prefix']
         job_type = current_job_info.get('job_type', 'text')  # 默认为文本类型
-        
+
         # 根据任务类型设置预览行数：视频1行，文本/图片3行
         max_preview_lines = 1 if job_type == 'video' else 3
-        
+
         # 获取结果预览和文件位置（不生成下载链接）
-        result_data = manager.get_results_preview_only(job_arn, output_bucket, output_prefix, max_preview_lines)
+        result_data = await asyncio.to_thread(
+            manager.get_results_preview_only, job_arn, output_bucket, output_prefix, max_preview_lines
+        )
         
         preview = result_data['preview']
         s3_uri = result_data['s3_uri']
@@ -556,16 +642,16 @@ def get_results(job_arn: str) -> tuple:
         manifest = result_data.get('manifest')
         manifest_s3_uri = result_data.get('manifest_s3_uri')
         
-        # 转换预览数据为DataFrame（截取output_text前200字符）
-        preview_data = []
-        for item in preview:
-            preview_data.append({
-                'record_id': item['record_id'],
-                'output_text': item['output_text'][:200] + '...' if len(item['output_text']) > 200 else item['output_text'],
-                'stop_reason': item['stop_reason']
-            })
-        
-        df = pd.DataFrame(preview_data) if preview_data else None
+        # 转换预览数据为DataFrame（列式构建；output_text已在解析时截断到200字符）
+        if preview:
+            preview_columns = {
+                'record_id': [r['record_id'] for r in preview],
+                'output_text': [r['output_text'] for r in preview],
+                'stop_reason': [r['stop_reason'] for r in preview],
+            }
+            df = await asyncio.to_thread(pd.DataFrame, preview_columns)
+        else:
+            df = None
         
         # 构建结果消息
         if parse_warning:
@@ -634,10 +720,10 @@ def get_results(job_arn: str) -> tuple:
         </div>
         """
         
-        return message, location_html, df
-        
+        yield message, location_html, df
+
     except Exception as e:
-        return f"❌ 获取结果失败: {str(e)}", "", None
+        yield f"❌ 获取结果失败: {str(e)}", "", None
 
 
 def start_video_batch_job(
@@ -662,21 +748,14 @@ def start_video_batch_job(
         """进度回调函数"""
         timestamp = datetime.now().strftime('%H:%M:%S')
         
-        if step == 'scan':
-            emoji = '🔍'
-        elif step == 'process':
-            emoji = '🎬'
+        emoji = VIDEO_STEP_EMOJI.get(step, '⏳')
+        if step == 'process':
             if total > 0:
                 progress_pct = (current / total * 0.6) + 0.3
                 progress(progress_pct, desc=f"处理视频 {current}/{total}")
         elif step == 'generate':
-            emoji = '📝'
             progress(0.9, desc="生成JSONL文件...")
-        elif step == 'error':
-            emoji = '❌'
-        else:
-            emoji = '⏳'
-        
+
         log_entry = f"{emoji} [{timestamp}] {details}"
         processing_log.append(log_entry)
     
@@ -778,7 +857,6 @@ def start_video_batch_job(
         
         # 保存任务信息到内存
         current_job_info['job_arn'] = result['job_arn']
-        current_job_info['manager'] = manager
         current_job_info['output_bucket'] = output_bucket
         current_job_info['output_prefix'] = output_prefix
         current_job_info['aws_region'] = aws_region
@@ -800,20 +878,14 @@ def start_video_batch_job(
         log_callback('submit', 1, 1, f'✅ 视频批处理任务已成功提交到Bedrock')
         
         # 构建状态消息
-        status_msg = f"""
-### ✅ 视频批处理任务已提交
-
-**任务信息：**
-- 任务名称: {result['job_name']}
-- 任务ARN: {result['job_arn']}
-- 模型: {model_name}
-- AWS Region: {aws_region}
-- 状态: 已提交
-
-{result['message']}
-
-*任务正在后台执行，请点击"刷新状态"按钮查看最新进度*
-"""
+        status_msg = SUBMIT_MSG_TEMPLATE.format(
+            job_label='视频',
+            job_name=result['job_name'],
+            job_arn=result['job_arn'],
+            model_name=model_name,
+            aws_region=aws_region,
+            message=result['message']
+        )
         
         return (
             status_msg,
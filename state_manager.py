@@ -2,37 +2,121 @@
 状态管理模块
 处理任务状态的保存、加载和恢复
 """
+import heapq
 import json
 import os
 from datetime import datetime
+from functools import lru_cache
 from config import STATE_FILE, current_job_info
 from batch_manager import BatchInferenceManager
 
+# orjson（Rust实现）比标准库json快数倍，未安装时回退到标准库
+try:
+    import orjson
+
+    def _json_loads(data):
+        return orjson.loads(data)
+
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode('utf-8')
+except ImportError:
+    def _json_loads(data):
+        return json.loads(data)
+
+    def _json_dumps(obj) -> str:
+        return json.dumps(obj, ensure_ascii=False)
+
+# 旧版状态文件（单个JSON对象），仅用于首次迁移
+LEGACY_STATE_FILE = 'job_states.json'
+
+# 超过该行数后重写状态文件，去除历史重复记录
+COMPACT_THRESHOLD = 1000
+
+# 内存索引：job_arn -> 最新记录，懒加载后所有读取都走内存
+_states_cache = None
+_state_lines = 0
+
+
+def _load_states() -> dict:
+    """懒加载状态文件到内存索引（逐行扫描，后写的记录覆盖先写的）"""
+    global _states_cache, _state_lines
+
+    if _states_cache is not None:
+        return _states_cache
+
+    _states_cache = {}
+    _state_lines = 0
+
+    # EAFP：直接打开文件并捕获FileNotFoundError，
+    # 避免exists()+open()的双重stat和二者之间的竞态窗口
+    try:
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = _json_loads(line)
+                except ValueError:
+                    continue
+                if record.get('job_arn'):
+                    _states_cache[record['job_arn']] = record
+                _state_lines += 1
+    except FileNotFoundError:
+        # 迁移旧版全量JSON文件
+        try:
+            with open(LEGACY_STATE_FILE, 'r', encoding='utf-8') as f:
+                _states_cache = _json_loads(f.read())
+            # 立即把迁移结果写成JSONL：否则首次追加写创建新文件后，
+            # 下次启动只读JSONL，旧记录全部丢失
+            _compact_states(_states_cache)
+        except FileNotFoundError:
+            pass
+
+    return _states_cache
+
+
+def _compact_states(states: dict):
+    """重写状态文件，每个任务只保留最新记录（原子替换）"""
+    global _state_lines
+
+    tmp_file = STATE_FILE + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        for record in states.values():
+            f.write(_json_dumps(record) + '\n')
+    os.replace(tmp_file, STATE_FILE)
+    _state_lines = len(states)
+
 
 def save_job_state(job_arn: str, job_info: dict):
-    """保存任务状态到文件"""
+    """保存任务状态（追加一行JSONL，不再重写整个文件）"""
+    global _state_lines
+
     try:
-        # 读取现有状态
-        states = {}
-        if os.path.exists(STATE_FILE):
-            with open(STATE_FILE, 'r', encoding='utf-8') as f:
-                states = json.load(f)
-        
+        states = _load_states()
+
         # 更新状态（不保存manager对象）
-        states[job_arn] = {
+        record = {
             'job_arn': job_arn,
             'output_bucket': job_info.get('output_bucket'),
             'output_prefix': job_info.get('output_prefix'),
             'aws_region': job_info.get('aws_region'),
             'input_bucket': job_info.get('input_bucket'),
             'input_prefix': job_info.get('input_prefix'),
+            'job_type': job_info.get('job_type'),
             'timestamp': datetime.now().isoformat()
         }
-        
-        # 保存到文件
-        with open(STATE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(states, f, indent=2, ensure_ascii=False)
-            
+        states[job_arn] = record
+
+        # 追加写入文件
+        with open(STATE_FILE, 'a', encoding='utf-8') as f:
+            f.write(_json_dumps(record) + '\n')
+        _state_lines += 1
+
+        # 历史记录过多时压缩文件
+        if _state_lines > COMPACT_THRESHOLD:
+            _compact_states(states)
+
     except Exception as e:
         print(f"保存状态失败: {e}")
 
@@ -40,12 +124,8 @@ def save_job_state(job_arn: str, job_info: dict):
 def load_job_state(job_arn: str = None) -> dict:
     """加载任务状态"""
     try:
-        if not os.path.exists(STATE_FILE):
-            return None
-            
-        with open(STATE_FILE, 'r', encoding='utf-8') as f:
-            states = json.load(f)
-        
+        states = _load_states()
+
         if job_arn:
             return states.get(job_arn)
         else:
@@ -54,7 +134,7 @@ def load_job_state(job_arn: str = None) -> dict:
                 latest = max(states.values(), key=lambda x: x.get('timestamp', ''))
                 return latest
             return None
-            
+
     except Exception as e:
         print(f"加载状态失败: {e}")
         return None
@@ -63,21 +143,17 @@ def load_job_state(job_arn: str = None) -> dict:
 def get_all_job_states() -> list:
     """获取所有任务状态列表"""
     try:
-        if not os.path.exists(STATE_FILE):
-            return []
-            
-        with open(STATE_FILE, 'r', encoding='utf-8') as f:
-            states = json.load(f)
-        
-        # 按时间倒序排序
-        job_list = sorted(states.values(), key=lambda x: x.get('timestamp', ''), reverse=True)
-        return job_list[:10]  # 只返回最近10个任务
-        
+        states = _load_states()
+
+        # 按时间倒序取最近10个任务（堆选择，O(N log 10)而非全量排序）
+        return heapq.nlargest(10, states.values(), key=lambda x: x.get('timestamp', ''))
+
     except Exception as e:
         print(f"获取任务列表失败: {e}")
         return []
 
 
+@lru_cache(maxsize=8)
 def create_batch_manager(bedrock_region: str = 'us-east-1', s3_region: str = 'us-east-1') -> BatchInferenceManager:
-    """创建批处理管理器"""
+    """创建批处理管理器（按region组合缓存，避免每次点击重建boto3客户端）"""
     return BatchInferenceManager(bedrock_region=bedrock_region, s3_region=s3_region)
@@ -2,7 +2,7 @@
 图片批处理UI模块
 """
 import gradio as gr
-from config import IMAGE_MODELS
+from config import IMAGE_MODEL_CHOICES
 from job_handlers import (
     preview_files, validate_configuration, start_image_batch_job,
     refresh_job_status, get_results, validate_image_single_inference
@@ -92,7 +92,7 @@ def create_image_batch_interface(job_arn_state, results_ready_state):
                 
                 with gr.Row():
                     model_dropdown = gr.Dropdown(
-                        choices=list(IMAGE_MODELS.keys()),
+                        choices=IMAGE_MODEL_CHOICES,
                         value="Claude Sonnet 4",
                         label="选择模型 *",
                         info="支持Vision功能的Claude模型"
@@ -216,18 +216,20 @@ def create_image_batch_interface(job_arn_state, results_ready_state):
     preview_btn.click(
         fn=preview_files,
         inputs=[input_bucket, s3_input_prefix, aws_region],
-        outputs=[preview_output, preview_message]
+        outputs=[preview_output, preview_message],
+        concurrency_id='s3'
     )
     
     # 事件绑定 - 验证权限
-    def validate_with_model(inp_bucket, out_bucket, role, region, model):
+    async def validate_with_model(inp_bucket, out_bucket, role, region, model):
         """包装函数确保所有参数都被传递"""
-        return validate_configuration(inp_bucket, out_bucket, role, region, model)
-    
+        return await validate_configuration(inp_bucket, out_bucket, role, region, model)
+
     validate_btn.click(
         fn=validate_with_model,
         inputs=[input_bucket, output_bucket, role_arn_input, aws_region, model_dropdown],
-        outputs=[validation_output]
+        outputs=[validation_output],
+        concurrency_id='s3'
     )
     
     # 事件绑定 - 开始批处理
@@ -240,21 +242,25 @@ def create_image_batch_interface(job_arn_state, results_ready_state):
             system_prompt_input, user_prompt_input,
             aws_region
         ],
-        outputs=[status_display, job_arn_state, refresh_btn, results_btn, processing_log_display]
+        outputs=[status_display, job_arn_state, refresh_btn, results_btn, processing_log_display],
+        concurrency_id='submit',
+        concurrency_limit=4
     )
     
     # 事件绑定 - 刷新状态
     refresh_btn.click(
         fn=refresh_job_status,
         inputs=[job_arn_state],
-        outputs=[status_display, results_ready_state, results_btn]
+        outputs=[status_display, results_ready_state, results_btn],
+        concurrency_id='s3'
     )
     
     # 事件绑定 - 获取结果
     results_btn.click(
         fn=get_results,
         inputs=[job_arn_state],
-        outputs=[results_message, download_link_html, results_df]
+        outputs=[results_message, download_link_html, results_df],
+        concurrency_id='s3'
     )
     
     # 事件绑定 - 单次推理验证
@@ -2,12 +2,16 @@
 文本批处理UI模块
 """
 import gradio as gr
-from config import TEXT_MODELS
+from config import TEXT_MODEL_CHOICES
 from job_handlers import (
     preview_files, validate_configuration, start_batch_job,
     refresh_job_status, get_results, validate_text_single_inference
 )
 
+# 输入模式切换的两组组件更新（启动时构建一次，回调内直接返回）
+_JSONL_MODE_UPDATES = (gr.update(visible=False), gr.update(visible=True), gr.update(visible=False))
+_RAW_MODE_UPDATES = (gr.update(visible=True), gr.update(visible=False), gr.update(visible=True))
+
 
 def create_text_batch_interface(job_arn_state, results_ready_state):
     """创建文本批处理界面"""
@@ -83,7 +87,7 @@ def create_text_batch_interface(job_arn_state, results_ready_state):
                 
                 with gr.Row():
                     model_dropdown = gr.Dropdown(
-                        choices=list(TEXT_MODELS.keys()),
+                        choices=TEXT_MODEL_CHOICES,
                         value="Claude Sonnet 4",
                         label="选择模型 *"
                     )
@@ -186,33 +190,33 @@ def create_text_batch_interface(job_arn_state, results_ready_state):
     # 事件绑定 - 切换输入模式
     def toggle_input_mode(use_jsonl):
         """切换输入模式显示"""
-        if use_jsonl:
-            return gr.update(visible=False), gr.update(visible=True), gr.update(visible=False)
-        else:
-            return gr.update(visible=True), gr.update(visible=False), gr.update(visible=True)
-    
+        return _JSONL_MODE_UPDATES if use_jsonl else _RAW_MODE_UPDATES
+
     use_existing_jsonl.change(
         fn=toggle_input_mode,
         inputs=[use_existing_jsonl],
-        outputs=[raw_files_group, jsonl_file_group, preview_btn]
+        outputs=[raw_files_group, jsonl_file_group, preview_btn],
+        show_progress='hidden'
     )
     
     # 事件绑定 - 预览文件
     preview_btn.click(
         fn=preview_files,
         inputs=[input_bucket, s3_input_prefix, aws_region],
-        outputs=[preview_output, preview_message]
+        outputs=[preview_output, preview_message],
+        concurrency_id='s3'
     )
     
     # 事件绑定 - 验证权限
-    def validate_with_model(inp_bucket, out_bucket, role, region, model):
+    async def validate_with_model(inp_bucket, out_bucket, role, region, model):
         """包装函数确保所有参数都被传递"""
-        return validate_configuration(inp_bucket, out_bucket, role, region, model)
+        return await validate_configuration(inp_bucket, out_bucket, role, region, model)
     
     validate_btn.click(
         fn=validate_with_model,
         inputs=[input_bucket, output_bucket, role_arn_input, aws_region, model_dropdown],
-        outputs=[validation_output]
+        outputs=[validation_output],
+        concurrency_id='s3'
     )
     
     # 事件绑定 - 开始批处理
@@ -224,21 +228,25 @@ def create_text_batch_interface(job_arn_state, results_ready_state):
             prompt_input, model_dropdown, role_arn_input,
             aws_region
         ],
-        outputs=[status_display, job_arn_state, refresh_btn, results_btn, processing_log_display]
+        outputs=[status_display, job_arn_state, refresh_btn, results_btn, processing_log_display],
+        concurrency_id='submit',
+        concurrency_limit=4
     )
     
     # 事件绑定 - 刷新状态
     refresh_btn.click(
         fn=refresh_job_status,
         inputs=[job_arn_state],
-        outputs=[status_display, results_ready_state, results_btn]
+        outputs=[status_display, results_ready_state, results_btn],
+        concurrency_id='s3'
     )
     
     # 事件绑定 - 获取结果
     results_btn.click(
         fn=get_results,
         inputs=[job_arn_state],
-        outputs=[results_message, download_link_html, results_df]
+        outputs=[results_message, download_link_html, results_df],
+        concurrency_id='s3'
     )
     
     # 事件绑定 - 单次推理验证